@@ -0,0 +1,132 @@
+import os
+import re
+import json
+from dataclasses import dataclass, field
+
+from pydantic import BaseModel
+
+# Placeholder API key for servers which don't check it, since the OpenAI client insists on having one
+NO_API_KEY = "unused"
+
+
+@dataclass(frozen=True)
+class ModelPricing:
+    """
+    The dollar cost per token of a model.
+    """
+    input: float
+    cached_input: float
+    output: float
+
+
+# Local servers don't charge per token
+FREE = ModelPricing(input=0, cached_input=0, output=0)
+
+# From https://openai.com/api/pricing/
+OPENAI_PRICING = {
+    "gpt-4o": ModelPricing(input=2.50 / 1_000_000, cached_input=1.25 / 1_000_000, output=10.00 / 1_000_000),
+    "gpt-4o-mini": ModelPricing(input=0.15 / 1_000_000, cached_input=0.075 / 1_000_000, output=0.60 / 1_000_000),
+    "gpt-4o-mini-2024-07-18": ModelPricing(input=0.15 / 1_000_000, cached_input=0.075 / 1_000_000, output=0.60 / 1_000_000),
+}
+
+
+@dataclass
+class LLMBackend:
+    """
+    An OpenAI-compatible API to make the LLM calls against, and what it can do.
+
+    Attributes:
+        name: The name used to select the backend on the command line.
+        model: The default model to analyze with.
+        base_url: The base URL of the API, or None for the OpenAI API.
+        api_key_env: The environment variable holding the API key.
+        pricing: The pricing of each model, or empty if the backend doesn't charge for calls.
+        max_concurrent_calls: Maximum number of calls in flight at once.
+        rate_limited: Whether the API enforces per-minute rate limits which calls should be paced to.
+        structured_output: Whether the API supports JSON schema response formats. Otherwise, the schema
+            is added to the system prompt and the JSON is parsed from the response text.
+        batch_api: Whether the API supports the Batch API.
+    """
+    name: str
+    model: str
+    base_url: str = None
+    api_key_env: str = "OPENAI_API_KEY"
+    pricing: dict[str, ModelPricing] = field(default_factory=dict)
+    max_concurrent_calls: int = 16
+    rate_limited: bool = True
+    structured_output: bool = True
+    batch_api: bool = True
+
+
+    def get_pricing(self, model: str) -> ModelPricing:
+        """
+        Get the pricing of the given model. Every model is free on a backend without pricing.
+
+        Raises:
+            ValueError: If the backend has pricing, but not for the given model.
+        """
+        if not self.pricing:
+            return FREE
+        if model not in self.pricing:
+            raise ValueError(f"No pricing for model {model} on the {self.name} backend")
+        return self.pricing[model]
+
+
+    def has_pricing(self, model: str) -> bool:
+        """
+        Whether the cost of calls to the given model is known.
+        """
+        return not self.pricing or model in self.pricing
+
+
+    def get_api_key(self) -> str:
+        """
+        Get the API key from the environment, or a placeholder if it isn't set for a backend which doesn't need one.
+        """
+        api_key = os.environ.get(self.api_key_env)
+        if not api_key and self.base_url:
+            return NO_API_KEY
+        return api_key
+
+
+BACKENDS = {
+    "openai": LLMBackend(
+        name="openai",
+        model="gpt-4o-mini-2024-07-18",
+        pricing=OPENAI_PRICING,
+    ),
+    # A local OpenAI-compatible inference server, such as vLLM, llama.cpp or Ollama
+    "local": LLMBackend(
+        name="local",
+        model="qwen2.5-coder",
+        base_url="http://localhost:8000/v1",
+        api_key_env="LOCAL_LLM_API_KEY",
+        max_concurrent_calls=32,
+        rate_limited=False,
+        structured_output=False,
+        batch_api=False,
+    ),
+}
+
+
+def add_schema_instructions(system_prompt: str, response_format: type[BaseModel]) -> str:
+    """
+    Add instructions to answer with JSON which conforms to the schema of the given response format,
+    for backends without structured output.
+    """
+    schema = json.dumps(response_format.model_json_schema())
+    return f"{system_prompt}\nRespond only with a JSON object which conforms to this JSON schema:\n{schema}\n"
+
+
+def parse_json_content(content: str, response_format: type[BaseModel]) -> BaseModel:
+    """
+    Parse the JSON object in the text of a response into the given response format, ignoring any text
+    (e.g. a Markdown code fence) around it.
+
+    Raises:
+        ValueError: If the response doesn't contain a valid object (including pydantic's ValidationError).
+    """
+    match = re.search(r"\{.*\}", content or "", re.DOTALL)
+    if match is None:
+        raise ValueError("Response does not contain a JSON object")
+    return response_format.model_validate_json(match.group(0))
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import threading
+
+from loguru import logger
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+# The SDK's helper for turning a pydantic model into a strict JSON schema, as used by beta.chat.completions.parse.
+# It isn't part of the public API, so this relies on the openai version pinned in requirements.txt.
+from openai.lib._pydantic import to_strict_json_schema
+from pydantic import BaseModel, ValidationError
+
+BATCH_DIR = "batches"
+
+# Fraction of the normal price charged for calls made through the Batch API
+BATCH_DISCOUNT = 0.5
+
+# Maximum number of requests in a single batch, as allowed by the Batch API
+BATCH_MAX_REQUESTS = 50_000
+
+# Maximum size of a batch input file. The Batch API allows up to 200 MB, this leaves some room.
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+
+# How long to wait between checks on the status of a batch
+BATCH_POLL_SECONDS = 60
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+
+# Statuses of a batch which will not change any more
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Modes of the batch runner
+COLLECT = "collect"
+ASSEMBLE = "assemble"
+
+
+def get_response_format_param(response_format: type[BaseModel]) -> dict:
+    """
+    Get the structured output `response_format` parameter of a chat completion request for the given
+    response format, the same as the one sent by beta.chat.completions.parse.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "schema": to_strict_json_schema(response_format),
+            "name": response_format.__name__,
+            "strict": True,
+        },
+    }
+
+
+class BatchRunner:
+    """
+    Runs LLM calls through the OpenAI Batch API, which is cheaper but can take hours to complete.
+
+    Analysis runs twice. In COLLECT mode, each call is recorded as a batch request instead of being made.
+    The requests are then written to JSONL batch files, submitted, and polled until they are done.
+    In ASSEMBLE mode, each call is answered from the results of the batch. Since both passes run the same
+    analysis code, the batch requests use exactly the same prompts and response formats as normal calls.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mode = None
+        self.requests = {}
+        self.results = {}
+        self.reservations = {}
+
+
+    def start(self, mode: str):
+        """
+        Start recording (COLLECT) or answering (ASSEMBLE) calls.
+        """
+        with self.lock:
+            self.mode = mode
+            if mode == COLLECT:
+                self.requests = {}
+                self.results = {}
+                self.reservations = {}
+
+
+    def stop(self):
+        """
+        Go back to making calls normally.
+        """
+        with self.lock:
+            self.mode = None
+
+
+    def collect(self, key: str, model: str, system_prompt: str, user_prompt: str, response_format: type[BaseModel]):
+        """
+        Record a call as a batch request. Identical calls share a key and are only requested once.
+        """
+        body = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "response_format": get_response_format_param(response_format),
+        }
+        with self.lock:
+            self.requests[key] = body
+
+
+    def set_reservations(self, reservations: dict[str, float]):
+        """
+        Set the part of the run's cost budget which was reserved for each batch request, keyed like the requests.
+        """
+        with self.lock:
+            self.reservations = dict(reservations)
+
+
+    def take_reservation(self, key: str) -> float:
+        """
+        Take the reservation for the batch request with the given key, so that it can be settled or released
+        when the request is answered. Returns 0 if it was already taken.
+        """
+        with self.lock:
+            return self.reservations.pop(key, 0)
+
+
+    def take_all_reservations(self) -> float:
+        """
+        Take the reservations for all the batch requests which weren't answered.
+        """
+        with self.lock:
+            total = sum(self.reservations.values())
+            self.reservations = {}
+            return total
+
+
+    def get_result(self, key: str, response_format: type[BaseModel]) -> tuple[ChatCompletion, BaseModel]:
+        """
+        Get the result of the batch request with the given key.
+
+        Returns:
+            A tuple of (completion, parsed), where completion is None if the batch has no result for
+            the request, and parsed is None if the model refused or the response couldn't be parsed.
+        """
+        body = self.results.get(key)
+        if body is None:
+            return None, None
+
+        completion = ChatCompletion.model_validate(body)
+        message = completion.choices[0].message
+        if message.refusal or not message.content:
+            return completion, None
+        try:
+            return completion, response_format.model_validate_json(message.content)
+        except ValidationError as e:
+            logger.error(f"Failed to parse batch result {key}: {e}")
+            return completion, None
+
+
+    def write_batch_files(self, batch_dir: str, max_requests: int = BATCH_MAX_REQUESTS,
+                          max_bytes: int = BATCH_MAX_BYTES) -> list[str]:
+        """
+        Write the collected requests to JSONL batch files in the given directory, splitting them
+        into several files if there are too many (or they are too large) for one batch. Requests which 
+        share a system prompt are written next to each other, so that the provider can reuse the cached 
+        prompt prefix when it is long enough to be cached.
+
+        Returns:
+            The paths of the batch files.
+        """
+        os.makedirs(batch_dir, exist_ok=True)
+        prefix = time.strftime("%Y%m%d-%H%M%S")
+        items = sorted(self.requests.items(), key=lambda item: item[1]["messages"][0]["content"])
+
+        paths = []
+        f, count, size = None, 0, 0
+        try:
+            for key, body in items:
+                request = {"custom_id": key, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+                line = (json.dumps(request) + "\n").encode("utf-8")
+                if f is None or count >= max_requests or size + len(line) > max_bytes:
+                    if f is not None:
+                        f.close()
+                    path = os.path.join(batch_dir, f"{prefix}-{len(paths)}-input.jsonl")
+                    f = open(path, "wb")
+                    paths.append(path)
+                    count, size = 0, 0
+                f.write(line)
+                count += 1
+                size += len(line)
+        finally:
+            if f is not None:
+                f.close()
+        return paths
+
+
+    def submit(self, client: OpenAI, paths: list[str]) -> list[str]:
+        """
+        Upload the given batch files and create a batch for each.
+
+        Returns:
+            The ids of the created batches.
+        """
+        batch_ids = []
+        for path in paths:
+            with open(path, "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(input_file_id=input_file.id,
+                                          endpoint=BATCH_ENDPOINT,
+                                          completion_window=BATCH_COMPLETION_WINDOW)
+            logger.info(f"Submitted batch {batch.id} from {path}")
+            batch_ids.append(batch.id)
+        return batch_ids
+
+
+    def wait(self, client: OpenAI, batch_ids: list[str], poll_seconds: float = BATCH_POLL_SECONDS) -> list:
+        """
+        Poll the given batches until they are all finished.
+
+        Returns:
+            The final state of each batch.
+        """
+        batches = {}
+        while len(batches) < len(batch_ids):
+            for batch_id in batch_ids:
+                if batch_id in batches:
+                    continue
+                batch = client.batches.retrieve(batch_id)
+                counts = batch.request_counts
+                if counts:
+                    logger.info(f"Batch {batch_id} is {batch.status}: {counts.completed}/{counts.total} completed, {counts.failed} failed")
+                else:
+                    logger.info(f"Batch {batch_id} is {batch.status}")
+                if batch.status in BATCH_FINAL_STATUSES:
+                    batches[batch_id] = batch
+            if len(batches) < len(batch_ids):
+                time.sleep(poll_seconds)
+        return [batches[batch_id] for batch_id in batch_ids]
+
+
+    def load_results(self, client: OpenAI, batches: list, batch_dir: str):
+        """
+        Download the output of the given finished batches, saving a copy to the given directory,
+        and load the results so that they can be used in ASSEMBLE mode.
+        """
+        for batch in batches:
+            if batch.error_file_id:
+                errors = client.files.content(batch.error_file_id).text
+                logger.warning(f"Batch {batch.id} had {len(errors.splitlines())} failed requests")
+            if not batch.output_file_id:
+                logger.error(f"Batch {batch.id} finished as {batch.status} without any output")
+                continue
+
+            output = client.files.content(batch.output_file_id).text
+            with open(os.path.join(batch_dir, f"{batch.id}-output.jsonl"), "w", encoding="utf-8") as f:
+                f.write(output)
+
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    self.results[result["custom_id"]] = response["body"]
+                else:
+                    logger.warning(f"Batch request {result['custom_id']} failed: {result.get('error') or response}")
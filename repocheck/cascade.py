@@ -0,0 +1,130 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+from loguru import logger
+
+from repocheck.code_facts import FunctionFacts
+from repocheck.model import ReadmeAnalysis, CodeReview, CodeDocumentationAnalysis
+
+# README scores (out of 5) which are too close to call, so a stronger model should take a second look
+README_BORDERLINE_SCORES = (2, 3)
+
+# Signs that a README contains setup commands
+SETUP_COMMAND_PATTERN = re.compile(r"```\s*(bash|sh|shell|console|zsh)\b|^\s*\$ |\b(pip|conda|uv pip|npm|mamba) install\b|\bgit clone\b",
+                                   re.MULTILINE | re.IGNORECASE)
+
+
+def get_readme_doubts(result: ReadmeAnalysis, content: str) -> list[str]:
+    """
+    Find the reasons to doubt an analysis of the given README content: a missing result, borderline scores,
+    or disagreement with what can be seen in the README itself.
+
+    Returns:
+        The list of reasons, which is empty if the analysis can be trusted.
+    """
+    if result is None:
+        return ["no result"]
+    doubts = []
+    if result.setup_completeness in README_BORDERLINE_SCORES:
+        doubts.append("borderline setup score")
+    if result.readme_quality in README_BORDERLINE_SCORES:
+        doubts.append("borderline README score")
+    if not result.setup_steps and SETUP_COMMAND_PATTERN.search(content):
+        doubts.append("missed setup commands")
+    if result.setup_steps and result.setup_completeness == 0:
+        doubts.append("setup steps with zero score")
+    return doubts
+
+
+def get_code_review_doubts(review: CodeReview, functions: list[FunctionFacts]) -> list[str]:
+    """
+    Find the reasons to doubt a review of a code file whose functions are known: a missing result,
+    functions which weren't rated, or documentation rated as good for functions without a docstring.
+
+    Returns:
+        The list of reasons, which is empty if the review can be trusted.
+    """
+    if review is None:
+        return ["no result"]
+    doubts = []
+    reviews = {function_review.function_name: function_review for function_review in review.function_review}
+    if functions and not reviews:
+        doubts.append("no functions rated")
+    elif any(function.name not in reviews for function in functions):
+        doubts.append("functions not rated")
+    if any(not function.has_docstring and reviews[function.name].api_documentation
+           for function in functions if function.name in reviews):
+        doubts.append("documentation rated without docstring")
+    return doubts
+
+
+def get_code_analysis_doubts(analysis: CodeDocumentationAnalysis, source: str) -> list[str]:
+    """
+    Find the reasons to doubt an analysis of code which couldn't be parsed locally: a missing result,
+    or no functions found in source which defines some.
+
+    Returns:
+        The list of reasons, which is empty if the analysis can be trusted.
+    """
+    if analysis is None:
+        return ["no result"]
+    if not analysis.function_analysis and re.search(r"^\s*(async\s+)?def ", source, re.MULTILINE):
+        return ["no functions found"]
+    return []
+
+
+class ModelCascade:
+    """
+    The models used for analysis, from the cheapest to the strongest. Each call is first made with the
+    cheapest model, and is only repeated with the next model if its result is in doubt. With a single model,
+    there is no escalation.
+
+    Counts the calls, cost and escalations of each tier, so that the trade-off can be tuned.
+    """
+
+    def __init__(self, models: list[str]):
+        self.lock = threading.Lock()
+        self.models = models
+        self.calls = Counter()
+        self.costs = defaultdict(float)
+        self.escalations = Counter()
+        self.reasons = Counter()
+
+
+    def set_models(self, models: list[str]):
+        """
+        Set the models to use, from the cheapest to the strongest.
+        """
+        with self.lock:
+            self.models = models
+
+
+    def record_call(self, model: str, cost: float):
+        """
+        Count a call made with the given model.
+        """
+        with self.lock:
+            self.calls[model] += 1
+            self.costs[model] += cost
+
+
+    def record_escalation(self, model: str, doubts: list[str]):
+        """
+        Count a result from the given model which was escalated to the next tier because of the given doubts.
+        """
+        with self.lock:
+            self.escalations[model] += 1
+            self.reasons.update(doubts)
+
+
+    def log_summary(self):
+        """
+        Log the calls, cost and escalations of each tier.
+        """
+        with self.lock:
+            for model in self.models:
+                logger.info(f"Model {model}: {self.calls[model]} calls, ${self.costs[model]:.4f}, "
+                            f"{self.escalations[model]} escalated")
+            if self.reasons:
+                logger.info("Escalation reasons: " + ", ".join(f"{reason} ({count})" for reason, count in self.reasons.most_common()))
@@ -0,0 +1,181 @@
+import io
+import ast
+import functools
+
+from loguru import logger
+
+from repocheck.rate_limit import estimate_tokens, CHARS_PER_TOKEN
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokenizer used by the gpt-4o family of models
+TIKTOKEN_ENCODING = "o200k_base"
+
+
+@functools.cache
+def get_encoding():
+    """
+    Get the tiktoken encoding, or None if tiktoken isn't installed or its encoding can't be loaded
+    (it is downloaded on first use), in which case token counts are estimated from the length of the text.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"Failed to load tiktoken encoding {TIKTOKEN_ENCODING}, estimating token counts instead: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the number of tokens in the given text.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Truncate the given text to at most the given number of tokens.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_lines(lines: list[str], max_tokens: int) -> list[str]:
+    """
+    Split the given lines into chunks of at most max_tokens tokens, without breaking any lines.
+    A single line which is longer than max_tokens is truncated.
+    """
+    chunks = []
+    chunk, chunk_tokens = [], 0
+    for line in lines:
+        line_tokens = count_tokens(line)
+        if line_tokens > max_tokens:
+            line = truncate_to_tokens(line, max_tokens)
+            line_tokens = max_tokens
+        if chunk and chunk_tokens + line_tokens > max_tokens:
+            chunks.append("".join(chunk))
+            chunk, chunk_tokens = [], 0
+        chunk.append(line)
+        chunk_tokens += line_tokens
+    if chunk:
+        chunks.append("".join(chunk))
+    return chunks
+
+
+def get_statement_start(node: ast.stmt) -> int:
+    """
+    Get the index of the first line of the given statement, including its decorators.
+    """
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators]) - 1
+
+
+def pack_segments(segments: list[str], max_tokens: int, header: str = "") -> list[str]:
+    """
+    Pack the given consecutive segments of source into as few chunks of at most max_tokens tokens as possible,
+    starting each chunk with the given header. A segment which doesn't fit in a chunk by itself is split by lines.
+    """
+    header_tokens = count_tokens(header) if header else 0
+    chunks = []
+    chunk, chunk_tokens = [], header_tokens
+    for segment in segments:
+        segment_tokens = count_tokens(segment)
+        if chunk and chunk_tokens + segment_tokens > max_tokens:
+            chunks.append(header + "".join(chunk))
+            chunk, chunk_tokens = [], header_tokens
+        if header_tokens + segment_tokens > max_tokens:
+            chunks.extend(split_lines(io.StringIO(segment).readlines(), max_tokens))
+            continue
+        chunk.append(segment)
+        chunk_tokens += segment_tokens
+    if chunk:
+        chunks.append(header + "".join(chunk))
+    return chunks
+
+
+def split_class(lines: list[str], node: ast.ClassDef, start: int, end: int, max_tokens: int) -> list[str]:
+    """
+    Split a class which is too large for one chunk along the boundaries of the statements in its body
+    (methods, etc.), so that each chunk can still be parsed and its methods are named after the class.
+    The first chunk starts with the lines from `start` to the body of the class (e.g. decorators), and 
+    every other chunk starts with a copy of the `class X(...):` line.
+
+    Parameters:
+        lines: The lines of the whole source.
+        node: The class statement.
+        start: The index of the first line of the class segment.
+        end: The index of the line after the class segment.
+        max_tokens: The maximum number of tokens in a chunk.
+    """
+    header_end = get_statement_start(node.body[0])
+    header_start = node.lineno - 1
+    if header_end <= header_start:
+        # The class is all on one line, so its body can't be split
+        return split_lines(lines[start:end], max_tokens)
+
+    starts = [header_end] + [get_statement_start(statement) for statement in node.body[1:]]
+    ends = starts[1:] + [end]
+    segments = ["".join(lines[segment_start:segment_end]) for segment_start, segment_end in zip(starts, ends)]
+
+    header = "".join(lines[header_start:header_end])
+    chunks = pack_segments(segments, max_tokens, header)
+    # Keep the decorators and comments above the class in the first chunk
+    prefix = "".join(lines[start:header_start])
+    if prefix:
+        chunks[0] = prefix + chunks[0]
+    return chunks
+
+
+def split_python_source(source: str, max_tokens: int) -> list[str]:
+    """
+    Split the given Python source into chunks of at most max_tokens tokens, breaking it along
+    the boundaries of top-level statements (functions, classes, etc.) so that no function is split
+    unless it is too large to fit in a chunk by itself. A class which is too large is split along the
+    boundaries of its methods, with the class line repeated in each chunk. The first chunk starts with
+    the module header (docstring, imports, etc.). Source which can't be parsed is split along line boundaries.
+
+    Returns:
+        The list of chunks, which is just the source itself if it fits within max_tokens.
+    """
+    if count_tokens(source) <= max_tokens:
+        return [source]
+
+    # Only split on newlines, to match the line numbers reported by the parser
+    lines = io.StringIO(source).readlines()
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        logger.debug("Failed to parse source, splitting it by lines")
+        return split_lines(lines, max_tokens)
+
+    # Each top-level statement starts a segment, which includes its decorators and any comments above it
+    starts = [get_statement_start(node) for node in tree.body]
+    if not starts:
+        return split_lines(lines, max_tokens)
+    starts[0] = 0
+    ends = starts[1:] + [len(lines)]
+
+    chunks = []
+    pending = []
+    for node, start, end in zip(tree.body, starts, ends):
+        segment = "".join(lines[start:end])
+        if isinstance(node, ast.ClassDef) and count_tokens(segment) > max_tokens:
+            # A huge class (e.g. a generated one) is split along its methods
+            chunks.extend(pack_segments(pending, max_tokens))
+            chunks.extend(split_class(lines, node, start, end, max_tokens))
+            pending = []
+        else:
+            pending.append(segment)
+    chunks.extend(pack_segments(pending, max_tokens))
+    return chunks
@@ -0,0 +1,115 @@
+import ast
+from dataclasses import dataclass
+
+from loguru import logger
+
+from repocheck.model import CodeDocumentationAnalysis, CodeReview, FunctionAnalysis
+
+# Parameters which never need a type annotation
+IMPLICIT_PARAMETERS = ("self", "cls")
+
+
+@dataclass
+class FunctionFacts:
+    """
+    The facts about a function which can be determined from its source without an LLM.
+    """
+    name: str
+    type_annotations: bool
+    has_docstring: bool
+
+
+def is_boilerplate(name: str) -> bool:
+    """
+    Check if the function with the given name is boilerplate (constructors and other dunder methods)
+    which isn't worth rating.
+    """
+    return name.startswith("__") and name.endswith("__")
+
+
+def has_type_annotations(node: ast.FunctionDef | ast.AsyncFunctionDef) -> bool:
+    """
+    Check if every parameter of the given function (other than self/cls) and its return value are annotated.
+    Constructors don't need a return annotation.
+    """
+    args = node.args
+    params = args.posonlyargs + args.args + args.kwonlyargs
+    params += [arg for arg in (args.vararg, args.kwarg) if arg is not None]
+    for index, param in enumerate(params):
+        if index == 0 and param.arg in IMPLICIT_PARAMETERS:
+            continue
+        if param.annotation is None:
+            return False
+    return node.returns is not None or node.name == "__init__"
+
+
+def extract_functions(source: str) -> list[FunctionFacts]:
+    """
+    Find the functions and methods defined in the given Python source, in order, and determine their
+    objective properties. Methods are named as `Class.method`. Functions nested inside other functions
+    and boilerplate methods are skipped.
+
+    Returns:
+        The list of functions, or None if the source can't be parsed.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        logger.debug("Failed to parse source, leaving the function analysis to the LLM")
+        return None
+
+    functions = []
+
+    def visit(nodes: list[ast.stmt], prefix: str):
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                visit(node.body, f"{prefix}{node.name}.")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not is_boilerplate(node.name):
+                functions.append(FunctionFacts(
+                    name=f"{prefix}{node.name}",
+                    type_annotations=has_type_annotations(node),
+                    has_docstring=ast.get_docstring(node) is not None,
+                ))
+
+    visit(tree.body, "")
+    return functions
+
+
+def format_function_list(functions: list[FunctionFacts]) -> str:
+    """
+    Format the names of the given functions for the prompt.
+    """
+    if not functions:
+        return "Functions to rate: (none)"
+    return "Functions to rate: " + ", ".join(function.name for function in functions)
+
+
+def build_code_analysis(review: CodeReview, functions: list[FunctionFacts]) -> CodeDocumentationAnalysis:
+    """
+    Combine the LLM's review of a file with the facts extracted from its source. A function only passes
+    for API documentation if it has a docstring which the LLM rated as good. Functions which the LLM
+    didn't rate are left out.
+    """
+    reviews = {function_review.function_name: function_review for function_review in review.function_review}
+    function_analysis = []
+    for function in functions:
+        function_review = reviews.get(function.name)
+        if function_review is None:
+            logger.debug(f"LLM did not rate {function.name} in {review.filepath}")
+            continue
+        function_analysis.append(FunctionAnalysis(
+            function_name=function.name,
+            clear_name=function_review.clear_name,
+            type_annotations=function.type_annotations,
+            api_documentation=function.has_docstring and function_review.api_documentation,
+            code_comments=function_review.code_comments,
+            explanation=function_review.explanation,
+        ))
+
+    return CodeDocumentationAnalysis(
+        filepath=review.filepath,
+        github_commit_hash=None,
+        high_level_documentation=review.high_level_documentation,
+        code_factored=review.code_factored,
+        function_analysis=function_analysis,
+    )
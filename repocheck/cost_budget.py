@@ -0,0 +1,71 @@
+import threading
+
+from loguru import logger
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised when an LLM call can't be started because the run's dollar budget would be exceeded.
+    """
+
+
+class CostBudget:
+    """
+    Tracks the dollar cost of LLM calls across all workers, and enforces an optional maximum for the run.
+
+    Before a call, its estimated cost is reserved. The reservation is refused if the calls already made
+    plus the ones in flight plus the new one could exceed the maximum. After the call, the reservation
+    is replaced by the actual cost.
+    """
+
+    def __init__(self, max_cost: float = None):
+        self.max_cost = max_cost
+        self.lock = threading.Lock()
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+
+    def set_max_cost(self, max_cost: float):
+        """
+        Set the maximum dollar cost for the run, or None for no limit.
+        """
+        with self.lock:
+            self.max_cost = max_cost
+
+
+    def reserve(self, estimated_cost: float) -> bool:
+        """
+        Reserve the estimated cost of a call.
+
+        Returns:
+            False if the remaining budget can't cover the call, in which case nothing is reserved.
+        """
+        with self.lock:
+            if self.max_cost is not None and self.spent + self.reserved + estimated_cost > self.max_cost:
+                return False
+            self.reserved += estimated_cost
+            return True
+
+
+    def settle(self, estimated_cost: float, actual_cost: float, prompt_tokens: int = 0, cached_tokens: int = 0):
+        """
+        Replace a reservation with the actual cost of the call, and count its prompt tokens,
+        including those which were served from the provider's prompt cache.
+        """
+        with self.lock:
+            self.reserved -= estimated_cost
+            self.spent += actual_cost
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            if self.max_cost is not None and self.spent > self.max_cost:
+                logger.warning(f"Spent ${self.spent:.4f}, which is over the budget of ${self.max_cost:.4f}")
+
+
+    def release(self, estimated_cost: float):
+        """
+        Cancel a reservation for a call which didn't happen.
+        """
+        with self.lock:
+            self.reserved -= estimated_cost
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from loguru import logger
+
+
+def normalize_content(content: str) -> str:
+    """
+    Normalize the whitespace of the given file content, so that copies of a file which only differ in line endings,
+    trailing whitespace, or blank lines at the start or end are considered identical. Indentation is kept.
+    """
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def get_content_key(content: str) -> str:
+    """
+    Get the key of the given file content, which is the same for all whitespace-normalized identical copies.
+    """
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+
+
+class ContentDeduplicator:
+    """
+    Makes sure that identical files found in several repositories are only analyzed once per run.
+
+    The first caller to claim a key becomes its owner and must analyze the content, then resolve the key with
+    the result (or fail it). Everyone else who claims the same key gets a future for the owner's result, which
+    coalesces concurrent analyses of the same content. Failed analyses (None results or errors) are not kept,
+    so a later claim of the same key analyzes the content again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.reused = 0
+        self.coalesced = 0
+
+
+    def claim(self, key: str) -> tuple[Future, bool]:
+        """
+        Claim the given content key.
+
+        Returns:
+            A tuple of (future, owner), where future will hold the result of the analysis, and owner is True
+            if the caller must do the analysis and then call resolve or fail.
+        """
+        with self.lock:
+            future = self.futures.get(key)
+            if future is not None:
+                if future.done():
+                    self.reused += 1
+                else:
+                    self.coalesced += 1
+                return future, False
+            future = Future()
+            self.futures[key] = future
+            return future, True
+
+
+    def resolve(self, key: str, result):
+        """
+        Set the result of the analysis of an owned key, unless it was already set. A None result is passed on to
+        those already waiting for it, but isn't kept.
+        """
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None or future.done():
+                return
+            if result is None:
+                del self.futures[key]
+        future.set_result(result)
+
+
+    def fail(self, key: str, error: BaseException):
+        """
+        Pass on the error which stopped the analysis of an owned key to those waiting for it, and forget the key.
+        """
+        with self.lock:
+            future = self.futures.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+
+    def log_summary(self):
+        """
+        Log how many analyses were saved by deduplication.
+        """
+        if self.reused or self.coalesced:
+            logger.info(f"Deduplicated files: {self.reused} reused, {self.coalesced} coalesced with an analysis in progress")
@@ -0,0 +1,87 @@
+import math
+import time
+import threading
+from datetime import datetime
+
+from github import Github
+from loguru import logger
+
+# Number of core API calls to leave unused, for other tools sharing the same token
+DEFAULT_RESERVE = 50
+
+# Number of core API calls made for each repository (the first page of contributors). Repositories with
+# more than PER_PAGE contributors acquire another call for each further page as it is fetched.
+CALLS_PER_REPO = 1
+
+# Number of items to request per page from paginated API calls
+PER_PAGE = 100
+
+
+class GithubBudget:
+    """
+    A budget of GitHub core API calls shared by all workers. Callers acquire calls from the budget
+    before using the API. When the budget runs out, the callers wait until GitHub resets the rate limit,
+    while workers which don't need the API (e.g. git and LLM work) keep going.
+
+    The budget is kept in sync with the rate limit headers of the most recent response, which PyGithub
+    tracks on the client, so calls made by other processes using the same token are accounted for.
+    """
+
+    def __init__(self, reserve: int = DEFAULT_RESERVE):
+        self.reserve = reserve
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.limit = None
+        self.reset_time = 0
+
+
+    def _sync(self, github: Github):
+        """
+        Update the budget from the rate limit headers last seen by the given client. Must be called with the lock held.
+        """
+        remaining, limit = github.rate_limiting
+        reset_time = github.rate_limiting_resettime
+        self.limit = limit
+        if self.remaining is None or reset_time > self.reset_time:
+            # A new rate limit window has started
+            self.remaining = remaining
+            self.reset_time = reset_time
+        else:
+            self.remaining = min(self.remaining, remaining)
+
+
+    def acquire(self, github: Github, calls: int = 1):
+        """
+        Reserve the given number of API calls, sleeping until the rate limit resets if there aren't enough left.
+        """
+        with self.lock:
+            while True:
+                self._sync(github)
+                if self.remaining - calls >= self.reserve:
+                    self.remaining -= calls
+                    return
+
+                wait = self.reset_time - time.time()
+                if wait > 0:
+                    # Other threads needing the API block on the lock while we sleep
+                    reset_at = datetime.fromtimestamp(self.reset_time).strftime("%H:%M:%S")
+                    logger.warning(f"GitHub API budget exhausted ({self.remaining} calls left), waiting until {reset_at}")
+                    time.sleep(wait + 1)
+
+                # Fetching the rate limit doesn't count against it, and refreshes the headers
+                github.get_rate_limit()
+                self.remaining = None
+
+
+    def log_estimate(self, github: Github, calls: int):
+        """
+        Log the estimated number of API calls needed for a scan, compared to what is left in the current window.
+        """
+        with self.lock:
+            self._sync(github)
+            reset_at = datetime.fromtimestamp(self.reset_time).strftime("%H:%M:%S")
+            logger.info(f"Scan needs about {calls} GitHub API calls (plus one per {PER_PAGE} contributors beyond the first {PER_PAGE} "
+                        f"of a repository), {self.remaining} of {self.limit} remaining until {reset_at}")
+            if calls > self.remaining - self.reserve:
+                resets = math.ceil((calls - (self.remaining - self.reserve)) / max(1, self.limit - self.reserve))
+                logger.warning(f"Scan will exceed the GitHub rate limit and wait for about {resets} reset(s)")
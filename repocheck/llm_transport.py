@@ -0,0 +1,113 @@
+import threading
+
+import httpx
+from loguru import logger
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+# Maximum number of open connections to the API, which should cover the number of concurrent calls
+DEFAULT_MAX_CONNECTIONS = 32
+
+# How long idle connections are kept open for reuse, in seconds
+KEEPALIVE_EXPIRY = 120
+
+# Timeouts for LLM calls, in seconds. Structured output for a large file can take a while to generate.
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+
+
+class LLMTransport:
+    """
+    A process-wide connection pool to the LLM API. Every analyzer uses the same client, so connections
+    (and their TLS sessions) are kept alive and reused across calls and repositories instead of being
+    set up again for every new client. HTTP/2 is used if the h2 package is installed.
+
+    The sync and async clients are created on first use and share the same settings. They don't retry
+    failed requests themselves, since callers retry with their own backoff, rate limiting and circuit breaker.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.lock = threading.Lock()
+        self.base_url = None
+        self.api_key = None
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client = None
+        self._async_client = None
+
+
+    def configure(self, base_url: str = None, api_key: str = None, max_connections: int = None,
+                  connect_timeout: float = None, read_timeout: float = None):
+        """
+        Change the settings of the transport. Must be called before the clients are first used.
+        The base URL and API key default to the OpenAI API and the OPENAI_API_KEY environment variable.
+        """
+        with self.lock:
+            if self._client or self._async_client:
+                logger.warning("LLM transport is already in use, new settings only apply to new clients")
+            if base_url is not None:
+                self.base_url = base_url
+            if api_key is not None:
+                self.api_key = api_key
+            if max_connections is not None:
+                self.max_connections = max_connections
+            if connect_timeout is not None:
+                self.connect_timeout = connect_timeout
+            if read_timeout is not None:
+                self.read_timeout = read_timeout
+
+
+    def _get_http_settings(self) -> dict:
+        """
+        Get the keyword arguments for creating an httpx client with the pool settings.
+        """
+        return {
+            "limits": httpx.Limits(max_connections=self.max_connections,
+                                   max_keepalive_connections=self.max_connections,
+                                   keepalive_expiry=KEEPALIVE_EXPIRY),
+            "timeout": httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            "http2": h2 is not None,
+        }
+
+
+    @property
+    def client(self) -> OpenAI:
+        """
+        The shared sync client.
+        """
+        with self.lock:
+            if self._client is None:
+                logger.debug(f"Creating LLM client with up to {self.max_connections} connections (HTTP/2: {h2 is not None})")
+                self._client = OpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0,
+                                      http_client=httpx.Client(**self._get_http_settings()))
+            return self._client
+
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        The shared async client, for callers which run in an event loop.
+        """
+        with self.lock:
+            if self._async_client is None:
+                self._async_client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0,
+                                                 http_client=httpx.AsyncClient(**self._get_http_settings()))
+            return self._async_client
+
+
+    def close(self):
+        """
+        Close the sync client and its connections. The async client must be closed from its event loop
+        with `await transport.async_client.close()`.
+        """
+        with self.lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
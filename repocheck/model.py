@@ -58,6 +58,25 @@ class CodeDocumentationAnalysis(BaseModel):
     function_analysis: list[FunctionAnalysis] = Field(description="The analysis of the functions in the file")
 
 
+class FunctionReview(BaseModel):
+    """ The LLM's rating of a function, without the properties which are determined from the source
+    """
+    function_name: str = Field(description="The function being rated, exactly as listed")
+    clear_name: bool = Field(description="Does the function have a clear name?")
+    api_documentation: bool = Field(description="Is the function's docstring clear and complete?")
+    code_comments: bool = Field(description="Does the function have good comments?")
+    explanation: str = Field(description="A very brief explanation for the scores")
+
+
+class CodeReview(BaseModel):
+    """ The LLM's review of a code file, which is combined with the facts extracted from the source
+    """
+    filepath: str = Field(description="The relative path to the file in the codebase that is being analyzed")
+    high_level_documentation: bool = Field(description="Does the file have high-level documentation?")
+    code_factored: bool = Field(description="Is the code appropriately factored into multiple functions?")
+    function_review: list[FunctionReview] = Field(description="The rating of each of the listed functions")
+
+
 class GlobalQualityScores(BaseModel):
     """ The overall quality scores computed for the project
     """
@@ -86,4 +105,5 @@ class ProjectAnalysis(BaseModel):
     readme_analysis: ReadmeAnalysis = Field(description="The analysis of the README file")
     license_analysis: LicenseAnalysis = Field(description="The analysis of the LICENSE file")
     code_analysis: list[CodeDocumentationAnalysis] = Field(description="The analysis of the code")
-    global_scores: GlobalQualityScores = Field(description="The overall quality scores computed for the project")
\ No newline at end of file
+    global_scores: GlobalQualityScores = Field(description="The overall quality scores computed for the project")
+    analysis_cost: Optional[float] = Field(default=None, description="The dollar cost of the LLM calls made for the analysis")
\ No newline at end of file
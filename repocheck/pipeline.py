@@ -0,0 +1,90 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable
+
+from loguru import logger
+
+# Default capacity of the queue in front of each stage
+DEFAULT_QUEUE_SIZE = 4
+
+# Marker telling a stage worker that there is no more input
+_DONE = object()
+
+
+class Stage:
+    """
+    A single stage of a pipeline, run by a fixed number of worker threads.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1):
+        """
+        Parameters:
+            name: The name of the stage, used for logging.
+            func: Function which transforms an item for the next stage. If it returns None,
+                  the item is dropped from the pipeline.
+            workers: The number of threads running this stage.
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+def run_pipeline(items: Iterable[Any], stages: list[Stage], queue_size: int = DEFAULT_QUEUE_SIZE) -> list[Any]:
+    """
+    Pass the given items through the given stages, with all stages running at the same time.
+
+    Each stage reads from a bounded queue, so when a slow stage falls behind, the stages in
+    front of it block instead of piling up work in memory. An item which raises an exception
+    in any stage is logged and dropped without affecting the other items.
+
+    Parameters:
+        items: The items to feed into the first stage.
+        stages: The stages to run, in order.
+        queue_size: The maximum number of items waiting in front of each stage.
+
+    Returns:
+        The outputs of the last stage, in order of completion.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    results = []
+    results_lock = threading.Lock()
+
+    def work(index: int):
+        stage = stages[index]
+        while True:
+            item = queues[index].get()
+            if item is _DONE:
+                return
+            try:
+                output = stage.func(item)
+            except Exception as e:
+                logger.exception(f"Pipeline stage '{stage.name}' failed: {e}")
+                continue
+            if output is None:
+                continue
+            if index + 1 < len(stages):
+                queues[index + 1].put(output)
+            else:
+                with results_lock:
+                    results.append(output)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        stage_threads = [threading.Thread(target=work, args=(index,), name=f"{stage.name}-{i}", daemon=True)
+                         for i in range(stage.workers)]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    # Feed the first stage, blocking whenever it is full
+    for item in items:
+        queues[0].put(item)
+
+    # Shut down each stage once the one before it has drained
+    for index, stage in enumerate(stages):
+        for _ in range(stage.workers):
+            queues[index].put(_DONE)
+        for thread in threads[index]:
+            thread.join()
+
+    return results
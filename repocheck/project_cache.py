@@ -94,6 +94,20 @@ class ProjectCache:
         return os.path.exists(os.path.join(self.project_cache_dir, ANALYSIS_FILE))
 
 
+    def load_analysis(self) -> ProjectAnalysis:
+        """
+        Load the existing analysis from the project's cache directory, or return None if there isn't a valid one.
+        """
+        if not self.analysis_exists():
+            return None
+        try:
+            with open(os.path.join(self.project_cache_dir, ANALYSIS_FILE), "r", encoding="utf-8") as f:
+                return ProjectAnalysis(**json.load(f))
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.warning(f"Failed to load existing analysis for {self.repo_full_name}: {e}")
+            return None
+
+
     def remove_existing_analysis(self):
         """
         Remove the existing analysis file in the project's cache directory, if it exists.
@@ -0,0 +1,200 @@
+import re
+import time
+import threading
+
+from loguru import logger
+
+# Starting limits, used until the API reports the account's actual limits in its response headers
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+
+# Fraction of the limits to actually use, leaving some room for estimation errors
+HEADROOM = 0.9
+
+# Rough number of characters per token for estimating the size of a prompt
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in the given text without running a tokenizer.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def parse_reset_duration(value: str) -> float:
+    """
+    Parse a duration from an x-ratelimit-reset-* header (e.g. "1s", "6m0s", "120ms") into seconds.
+    """
+    if not value:
+        return 0
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        seconds += float(amount) * units[unit]
+    return seconds
+
+
+class RateLimiter:
+    """
+    A client-side limiter which paces LLM calls to stay just under the account's requests-per-minute
+    and tokens-per-minute limits. It is shared by all threads making calls.
+
+    Each limit is tracked as a bucket which refills continuously over a minute. Before a call, the caller
+    acquires one request and the estimated number of tokens, waiting if either bucket is empty. After
+    the call, the token estimate is corrected from the actual usage, and both the limits and the buckets
+    are adjusted from the x-ratelimit-* headers returned by the API.
+    """
+
+    def __init__(self,
+                 requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE):
+        self.condition = threading.Condition()
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_requests_per_minute = None
+        self.max_tokens_per_minute = None
+        self.available_requests = self._request_capacity()
+        self.available_tokens = self._token_capacity()
+        self.paused_until = 0.0
+        self.last_refill = time.monotonic()
+        self.enabled = True
+
+
+    def set_limits(self, max_requests_per_minute: int = None, max_tokens_per_minute: int = None):
+        """
+        Cap the limits used by the limiter, regardless of what the API reports for the account.
+        """
+        with self.condition:
+            self.max_requests_per_minute = max_requests_per_minute
+            self.max_tokens_per_minute = max_tokens_per_minute
+            self.available_requests = min(self.available_requests, self._request_capacity())
+            self.available_tokens = min(self.available_tokens, self._token_capacity())
+
+
+    def disable(self):
+        """
+        Stop pacing calls, for APIs which don't have rate limits (e.g. a local inference server).
+        Pauses are still honored, since such a server may still turn calls away when it is overloaded.
+        """
+        with self.condition:
+            self.enabled = False
+            self.condition.notify_all()
+
+
+    def _request_capacity(self) -> float:
+        limit = self.requests_per_minute
+        if self.max_requests_per_minute:
+            limit = min(limit, self.max_requests_per_minute)
+        return max(1.0, limit * HEADROOM)
+
+
+    def _token_capacity(self) -> float:
+        limit = self.tokens_per_minute
+        if self.max_tokens_per_minute:
+            limit = min(limit, self.max_tokens_per_minute)
+        return max(1.0, limit * HEADROOM)
+
+
+    def _refill(self):
+        """
+        Add the capacity which has accumulated since the last refill. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        request_capacity, token_capacity = self._request_capacity(), self._token_capacity()
+        self.available_requests = min(request_capacity, self.available_requests + elapsed * request_capacity / 60)
+        self.available_tokens = min(token_capacity, self.available_tokens + elapsed * token_capacity / 60)
+
+
+    def acquire(self, tokens: int):
+        """
+        Wait until there is room for one more request with the given estimated number of tokens, and reserve it.
+        If the limiter is disabled, only wait while calls are paused.
+        """
+        with self.condition:
+            # A request larger than the whole bucket can never fit, so just wait for a full bucket
+            tokens = min(tokens, self._token_capacity())
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif not self.enabled:
+                    return
+                else:
+                    request_wait = (1 - self.available_requests) * 60 / self._request_capacity()
+                    token_wait = (tokens - self.available_tokens) * 60 / self._token_capacity()
+                    wait = max(request_wait, token_wait)
+                    if wait <= 0:
+                        self.available_requests -= 1
+                        self.available_tokens -= tokens
+                        return
+                self.condition.wait(timeout=wait)
+
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Correct the token bucket once the actual token usage of a request is known.
+        """
+        with self.condition:
+            self.available_tokens -= actual_tokens - estimated_tokens
+            self.condition.notify_all()
+
+
+    def update_from_headers(self, headers):
+        """
+        Adjust the limits and the buckets from the x-ratelimit-* headers of an API response.
+        """
+        def header_int(name: str) -> int:
+            try:
+                return int(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        limit_requests = header_int("x-ratelimit-limit-requests")
+        limit_tokens = header_int("x-ratelimit-limit-tokens")
+        remaining_requests = header_int("x-ratelimit-remaining-requests")
+        remaining_tokens = header_int("x-ratelimit-remaining-tokens")
+
+        with self.condition:
+            if limit_requests and limit_requests != self.requests_per_minute:
+                logger.debug(f"Adjusting request limit to {limit_requests} per minute")
+                self.requests_per_minute = limit_requests
+            if limit_tokens and limit_tokens != self.tokens_per_minute:
+                logger.debug(f"Adjusting token limit to {limit_tokens} per minute")
+                self.tokens_per_minute = limit_tokens
+
+            # The server knows about calls from other processes on the same account, so never assume more room than it reports
+            if remaining_requests is not None:
+                self.available_requests = min(self.available_requests, remaining_requests - (1 - HEADROOM) * self.requests_per_minute)
+            if remaining_tokens is not None:
+                self.available_tokens = min(self.available_tokens, remaining_tokens - (1 - HEADROOM) * self.tokens_per_minute)
+            self.condition.notify_all()
+
+
+    def pause(self, seconds: float):
+        """
+        Stop all calls for the given number of seconds, e.g. after the API has returned a rate limit error.
+        """
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+
+    def pause_from_headers(self, headers):
+        """
+        Stop all calls until the limits are reset, according to the Retry-After or x-ratelimit-reset-* headers.
+
+        Returns:
+            The number of seconds that calls are paused for.
+        """
+        try:
+            seconds = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            seconds = max(parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+                          parse_reset_duration(headers.get("x-ratelimit-reset-tokens")))
+        seconds = max(seconds, 1)
+        self.pause(seconds)
+        return seconds
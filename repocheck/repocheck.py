@@ -2,11 +2,19 @@
 
 import os
 import sys
-import random
-from datetime import datetime
+import socket
+import math
+import hashlib
+import time
+import functools
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 import argparse
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
 
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 from github import Github, Auth, Repository
 from loguru import logger
 from nbconvert import PythonExporter
@@ -14,18 +22,111 @@ import nbformat
 
 from repocheck.model import *
 from repocheck.project_cache import ProjectCache
-
-# Use consistent seed so that we sample the same files each time
-random.seed(42)
+from repocheck.pipeline import Stage, run_pipeline
+from repocheck.work_queue import WorkQueue
+from repocheck.run_journal import RunJournal, DONE, FAILED, SKIPPED
+from repocheck.rate_limit import RateLimiter, estimate_tokens
+from repocheck.github_budget import GithubBudget, CALLS_PER_REPO, PER_PAGE
+from repocheck.cost_budget import CostBudget, BudgetExceededError
+from repocheck.response_cache import ResponseCache
+from repocheck.chunking import count_tokens, truncate_to_tokens, split_python_source
+from repocheck.code_facts import extract_functions, format_function_list, build_code_analysis
+from repocheck.batch import BatchRunner, BATCH_DIR, BATCH_DISCOUNT, COLLECT, ASSEMBLE
+from repocheck.llm_transport import LLMTransport
+from repocheck.backend import BACKENDS, add_schema_instructions, parse_json_content
+from repocheck.cascade import ModelCascade, get_readme_doubts, get_code_review_doubts, get_code_analysis_doubts
+from repocheck.telemetry import TelemetryStore, CallRecord, SOURCE_API, SOURCE_CACHE, SOURCE_BATCH, STATUS_OK, STATUS_REFUSED, STATUS_FAILED
+from repocheck.retry import CircuitBreaker, LLMUnavailableError, is_retryable, get_retry_after, get_backoff_delay
+from repocheck.sampling import sample_files
+from repocheck.dedup import ContentDeduplicator, get_content_key
+from repocheck.wire import (WireReadmeAnalysis, WireCodeReview, WirePackedCodeReview, WireCodeAnalysis,
+                            to_readme_analysis, to_code_review, to_code_reviews, to_code_analysis)
 
 LOG_LEVEL = "INFO"
 ANALYZE_CODE = True
 
-# Maximum number of code files to analyze (sample randomly if there are more)
+# Maximum number of code files to analyze (a stable sample is taken if there are more)
 MAX_CODE_FILES = 10
 
-# Model to use for analysis
-OPENAI_MODEL = "gpt-4o-mini-2024-07-18"
+# Backend to make the LLM calls against, and its model to use for analysis
+LLM_BACKEND = BACKENDS["openai"]
+OPENAI_MODEL = LLM_BACKEND.model
+
+# Stronger model which re-analyzes doubtful results when running with --cascade
+CASCADE_MODEL = "gpt-4o"
+
+# Maximum number of tokens sent in the user prompt of a single call
+MAX_PROMPT_TOKENS = 25_000
+
+# Code files larger than this many tokens are split into chunks which are analyzed separately
+MAX_CHUNK_TOKENS = 8_000
+
+# When packing is enabled (--pack), code files smaller than this many tokens are analyzed 
+# together in a single call, up to PACK_MAX_TOKENS and PACK_MAX_FILES per call
+PACK_SMALL_FILES = False
+SMALL_FILE_TOKENS = 1_500
+PACK_MAX_TOKENS = 6_000
+PACK_MAX_FILES = 8
+
+# Maximum number of code files of a single repository to analyze concurrently
+MAX_FILE_JOBS = 4
+
+# Maximum number of LLM calls in flight across all repositories
+MAX_LLM_CALLS = 16
+LLM_CALL_SEMAPHORE = threading.BoundedSemaphore(MAX_LLM_CALLS)
+
+# Pooled connections to the OpenAI API, shared by all analyzers
+LLM_TRANSPORT = LLMTransport(max_connections=MAX_LLM_CALLS)
+
+# Paces all LLM calls to stay under the account's rate limits
+RATE_LIMITER = RateLimiter()
+
+# Budget of GitHub API calls shared by all workers
+GITHUB_BUDGET = GithubBudget()
+
+# Dollar cost of the LLM calls made during the run, with an optional maximum
+COST_BUDGET = CostBudget()
+
+# Stops all LLM calls while the provider appears to be down
+CIRCUIT_BREAKER = CircuitBreaker()
+
+# Models to analyze with, from the cheapest to the strongest, and the calls made with each
+MODEL_CASCADE = ModelCascade([OPENAI_MODEL])
+
+# Analyses of the code files seen during the run, keyed by their whitespace-normalized content
+CONTENT_DEDUP = ContentDeduplicator()
+
+# Persistent cache of LLM responses, keyed by the model, prompts and response schema (None to disable)
+RESPONSE_CACHE: ResponseCache = None
+
+# Store for the telemetry of every LLM call made during the run (None to disable)
+TELEMETRY: TelemetryStore = None
+
+# Records and answers LLM calls through the Batch API when running with --batch
+BATCH_RUNNER = BatchRunner()
+
+# Expected number of completion tokens per call, used when reserving room under the token rate limit
+EXPECTED_COMPLETION_TOKENS = 1000
+
+# Number of times to retry a call after a temporary error (rate limits, timeouts, server errors)
+MAX_CALL_RETRIES = 5
+
+# Number of times the client retries a failed Batch API call (uploads, status checks, downloads)
+BATCH_API_RETRIES = 5
+
+# Default number of repositories to process concurrently during an org scan
+DEFAULT_JOBS = 1
+
+# Orders in which the repositories of an org scan can be processed
+ORDER_GITHUB = "github"
+ORDER_STALENESS = "staleness"
+
+# Value of --resume to resume the most recent run of the same scan
+RESUME_LATEST = "latest"
+
+# Number of workers for the git and content collection stages when running with --pipeline
+PIPELINE_FETCH_WORKERS = 4
+PIPELINE_COLLECT_WORKERS = 2
 
 
 def read_file(file_path: str) -> str:
@@ -52,7 +153,7 @@ def collect_content(project_cache: ProjectCache) -> tuple[tuple[str, str], tuple
     """
     readme = None, ""
     license = None, ""
-    code_files = []
+    code_sizes = {}
     code = {}
     local_path = project_cache.repo_path
 
@@ -80,15 +181,15 @@ def collect_content(project_cache: ProjectCache) -> tuple[tuple[str, str], tuple
                     logger.debug(f"Skipping {file} because it is a test file")
                     continue
                 
-                code_files.append(file_path)
+                code_sizes[real_path] = os.path.getsize(file_path)
 
-    # Randomly select from code_files if we have more files than the limit
-    if len(code_files) > MAX_CODE_FILES:
-        code_files = random.sample(code_files, MAX_CODE_FILES)
-        logger.debug(f"Randomly selected {MAX_CODE_FILES} files to analyze.")
+    # Sample the same files on every run, unless the sampled files themselves change
+    code_files = sample_files(code_sizes, MAX_CODE_FILES)
+    if len(code_sizes) > MAX_CODE_FILES:
+        logger.debug(f"Sampled {MAX_CODE_FILES} of {len(code_sizes)} files to analyze.")
 
-    for file_path in code_files:
-        real_path = os.path.relpath(file_path, local_path)
+    for real_path in code_files:
+        file_path = os.path.join(local_path, real_path)
         if real_path.endswith(".py"):
             try:
                 code[real_path] = read_file(file_path)
@@ -108,79 +209,391 @@ def collect_content(project_cache: ProjectCache) -> tuple[tuple[str, str], tuple
     return readme, license, code
 
 
-def calculate_completion_cost(completion) -> float:
+def estimate_cost(prompt_tokens: int, output_tokens: int, model: str = OPENAI_MODEL) -> float:
     """
-    Calculate the total dollar cost of an OpenAI API call.
+    Calculate the dollar cost of an LLM call to the given model with the given number of tokens.
     """
+    pricing = LLM_BACKEND.get_pricing(model)
+    return prompt_tokens * pricing.input + output_tokens * pricing.output
+
+
+def get_cached_tokens(completion) -> int:
+    """
+    Get the number of prompt tokens of an LLM call which were served from the provider's prompt cache.
+    """
+    details = completion.usage.prompt_tokens_details
+    if details is None or details.cached_tokens is None:
+        return 0
+    return details.cached_tokens
 
-    # From https://openai.com/api/pricing/
-    COST_PER_INPUT_TOKEN = {
-        "gpt-4o": 2.50 / 1_000_000,
-        "gpt-4o-mini": 0.15 / 1_000_000,
-        "gpt-4o-mini-2024-07-18": 0.15 / 1_000_000,
-    }
-    COST_PER_OUTPUT_TOKEN = {
-        "gpt-4o": 10.00 / 1_000_000,
-        "gpt-4o-mini": 0.60 / 1_000_000,
-        "gpt-4o-mini-2024-07-18": 0.60 / 1_000_000,
-    }
 
+def calculate_completion_cost(completion, batch: bool = False, model: str = OPENAI_MODEL) -> float:
+    """
+    Calculate the total dollar cost of an LLM call. Prompt tokens which hit the provider's
+    prompt cache are billed at the cached rate, and calls made through the Batch API are discounted.
+    """
     prompt_tokens = completion.usage.prompt_tokens
     output_tokens = completion.usage.completion_tokens
-    total_cost = (prompt_tokens * COST_PER_INPUT_TOKEN[OPENAI_MODEL]
-                    + output_tokens * COST_PER_OUTPUT_TOKEN[OPENAI_MODEL])
+    cached_tokens = get_cached_tokens(completion)
+    total_cost = (estimate_cost(prompt_tokens - cached_tokens, output_tokens, model)
+                  + cached_tokens * LLM_BACKEND.get_pricing(model).cached_input)
+    if batch:
+        total_cost *= BATCH_DISCOUNT
     return total_cost
 
 
 def analyze_file_content(client: OpenAI, 
                          filepath: str, 
-                         file_content: str, 
                          system_prompt: str, 
                          user_prompt: str, 
-                         response_format: BaseModel):
+                         response_format: BaseModel,
+                         model: str = OPENAI_MODEL,
+                         repo_name: str = None):
     """
-    Analyze the given file content using the OpenAI API's structured output feature.
+    Analyze a file using the OpenAI API's structured output feature. The file content is part of the user prompt,
+    which is truncated if it is too long. If the same prompts were already answered, the cached response is used instead.
+    While BATCH_RUNNER is active, the call is recorded for, or answered from, the Batch API instead.
 
     Parameters:
         client: The OpenAI client to use to make the API call.
         filepath: The path to the file being analyzed.
-        file_content: The content of the file being analyzed.
         system_prompt: The system prompt to use for the API call.
         user_prompt: The user prompt to use for the API call.
         response_format: The response format to use for the API call.
+        model: The model to use for the API call.
+        repo_name: The full name of the repository, for the telemetry.
 
     Returns:
-        A tuple of (completion, cost), where completion is the completion from the API call and cost is the cost of the API call.
+        A tuple of (result, cost), where result is the parsed response (or None if the analysis failed 
+        or was refused) and cost is the cost of the API call.
+
+    Raises:
+        BudgetExceededError: If the remaining budget for the run can't cover the estimated cost of the call.
+        LLMUnavailableError: If the call kept failing with temporary errors.
     """
-    CHAR_LIMIT = 100000
-    if len(file_content) > CHAR_LIMIT:
+    if count_tokens(user_prompt) > MAX_PROMPT_TOKENS:
         logger.warning(f"File {filepath} exceeds the token limit and will be truncated.")
-        file_content = file_content[:CHAR_LIMIT]
+        user_prompt = truncate_to_tokens(user_prompt, MAX_PROMPT_TOKENS)
+
+    call = CallRecord(repo=repo_name, file=filepath, model=model)
+    request_key = ResponseCache.get_key(model, system_prompt, response_format, user_prompt)
+    if RESPONSE_CACHE:
+        result = RESPONSE_CACHE.get(request_key, response_format)
+        if result is not None:
+            logger.debug(f"Using cached analysis for {filepath}")
+            record_telemetry(call, source=SOURCE_CACHE)
+            return result, 0
+
+    if BATCH_RUNNER.mode == COLLECT:
+        BATCH_RUNNER.collect(request_key, model, system_prompt, user_prompt, response_format)
+        return None, 0
 
+    if BATCH_RUNNER.mode == ASSEMBLE:
+        completion, result = BATCH_RUNNER.get_result(request_key, response_format)
+        reserved = BATCH_RUNNER.take_reservation(request_key)
+        if completion is not None:
+            cost = calculate_completion_cost(completion, batch=True, model=model)
+            COST_BUDGET.settle(reserved, cost, completion.usage.prompt_tokens, get_cached_tokens(completion))
+            MODEL_CASCADE.record_call(model, cost)
+            record_telemetry(call, completion, cost, STATUS_OK if result else STATUS_REFUSED, SOURCE_BATCH)
+            if result is None:
+                logger.info(f"[ERROR] refused to analyze {filepath}: {completion.choices[0].message.refusal}")
+                return None, cost
+            if RESPONSE_CACHE:
+                RESPONSE_CACHE.put(request_key, result)
+            return result, cost
+        COST_BUDGET.release(reserved)
+        logger.warning(f"No batch result for {filepath}, analyzing it directly")
+
+    estimated_prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    estimated_cost = estimate_cost(estimated_prompt_tokens, EXPECTED_COMPLETION_TOKENS, model)
+    if not COST_BUDGET.reserve(estimated_cost):
+        raise BudgetExceededError(f"Budget of ${COST_BUDGET.max_cost:.2f} can't cover the analysis of {filepath}")
+
+    completion, parsed, cost = None, None, 0
     try:
+        completion, parsed, cost = request_completion(client, filepath, system_prompt, user_prompt, response_format,
+                                                      estimated_prompt_tokens + EXPECTED_COMPLETION_TOKENS, model, call)
+    finally:
+        if completion is None:
+            COST_BUDGET.settle(estimated_cost, cost)
+            record_telemetry(call, status=STATUS_FAILED)
+        else:
+            COST_BUDGET.settle(estimated_cost, cost, completion.usage.prompt_tokens, get_cached_tokens(completion))
+            MODEL_CASCADE.record_call(model, cost)
+            record_telemetry(call, completion, cost, STATUS_OK if parsed else STATUS_REFUSED)
+
+    if completion is None:
+        return None, cost
+
+    if parsed:
+        if RESPONSE_CACHE:
+            RESPONSE_CACHE.put(request_key, parsed)
+        return parsed, cost
+
+    message = completion.choices[0].message
+    if message.refusal:
+        logger.info(f"[ERROR] refused to analyze {filepath}: {message.refusal}")
+
+    return None, cost
+
+
+def send_request(client: OpenAI, system_prompt: str, user_prompt: str, response_format: BaseModel, model: str):
+    """
+    Send a chat completion request to LLM_BACKEND, with structured output if the backend supports it, 
+    and otherwise with the response schema added to the system prompt.
+
+    Returns:
+        The raw response.
+    """
+    if LLM_BACKEND.structured_output:
         # Using beta API so that we can structured output
-        completion = client.beta.chat.completions.parse(
-            model=OPENAI_MODEL,
+        return client.beta.chat.completions.with_raw_response.parse(
+            model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
             response_format=response_format,
         )
-                
-        cost = calculate_completion_cost(completion)
-        return completion, cost
-    
-    except Exception as e:
-        logger.error(f"Failed to analyze code {filepath}: {e}")
-        return None, 0
+    return client.chat.completions.with_raw_response.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": add_schema_instructions(system_prompt, response_format)},
+            {"role": "user", "content": user_prompt},
+        ],
+    )
+
+
+def record_telemetry(call: CallRecord, completion=None, cost: float = 0, status: str = STATUS_OK, source: str = SOURCE_API):
+    """
+    Fill in the outcome of a call and add it to the telemetry, if enabled.
+    """
+    if TELEMETRY is None:
+        return
+    call.source = source
+    call.status = status
+    call.cost = cost
+    if completion is not None:
+        call.prompt_tokens = completion.usage.prompt_tokens
+        call.completion_tokens = completion.usage.completion_tokens
+        call.cached_tokens = get_cached_tokens(completion)
+    TELEMETRY.record(call)
+
+
+def request_completion(client: OpenAI, 
+                       filepath: str, 
+                       system_prompt: str, 
+                       user_prompt: str, 
+                       response_format: BaseModel, 
+                       estimated_tokens: int,
+                       model: str = OPENAI_MODEL,
+                       call: CallRecord = None):
+    """
+    Make an LLM call to LLM_BACKEND with structured output, pacing it with the rate limiter. If the backend
+    doesn't support structured output, the response schema is added to the system prompt instead and the JSON
+    is parsed from the response. Calls which fail with a temporary error are retried with exponential backoff 
+    and jitter (waiting at least as long as the server's Retry-After), and every call waits while the circuit
+    breaker is open.
+
+    Returns:
+        A tuple of (completion, parsed, cost), where completion is None if the call failed with an error
+        which retrying wouldn't fix (e.g. a bad request), and parsed is None if the model refused or its
+        response couldn't be parsed.
+        The latency, waiting time and number of retries are recorded in the given call telemetry.
+
+    Raises:
+        LLMUnavailableError: If the call still fails with a temporary error after MAX_CALL_RETRIES retries.
+    """
+    call = call or CallRecord(repo=None, file=filepath, model=model)
+    started = time.monotonic()
+    request_seconds = 0.0
+    for attempt in range(MAX_CALL_RETRIES + 1):
+        call.retries = attempt
+        try:
+            CIRCUIT_BREAKER.wait()
+            RATE_LIMITER.acquire(estimated_tokens)
+
+            with LLM_CALL_SEMAPHORE:
+                request_started = time.monotonic()
+                try:
+                    response = send_request(client, system_prompt, user_prompt, response_format, model)
+                finally:
+                    call.latency = time.monotonic() - request_started
+                    request_seconds += call.latency
+                    call.wait = time.monotonic() - started - request_seconds
+
+            CIRCUIT_BREAKER.record_success()
+            RATE_LIMITER.update_from_headers(response.headers)
+            completion = response.parse()
+            RATE_LIMITER.record_usage(estimated_tokens, completion.usage.total_tokens)
+                    
+            cost = calculate_completion_cost(completion, model=model)
+            message = completion.choices[0].message
+            if LLM_BACKEND.structured_output:
+                return completion, message.parsed, cost
+            try:
+                return completion, parse_json_content(message.content, response_format), cost
+            except ValueError as e:
+                logger.error(f"Failed to parse the response for {filepath}: {e}")
+                return completion, None, cost
+
+        except RateLimitError as e:
+            # Not an outage, the rate limiter pauses all calls until the limit resets
+            CIRCUIT_BREAKER.record_success()
+            RATE_LIMITER.update_from_headers(e.response.headers)
+            if RATE_LIMITER.enabled:
+                seconds = RATE_LIMITER.pause_from_headers(e.response.headers)
+            else:
+                # Without known limits to wait for (e.g. an overloaded local server), back off like any other temporary error
+                seconds = get_backoff_delay(attempt, get_retry_after(e))
+                RATE_LIMITER.pause(seconds)
+            logger.warning(f"Rate limited while analyzing {filepath} (attempt {attempt+1}), pausing for {seconds:.1f}s")
+            error = e
+
+        except Exception as e:
+            if not is_retryable(e):
+                # The provider answered, so it isn't down, but the same call would fail again
+                CIRCUIT_BREAKER.record_success()
+                logger.error(f"Failed to analyze code {filepath}: {e}")
+                return None, None, 0
+
+            CIRCUIT_BREAKER.record_failure()
+            error = e
+            if attempt < MAX_CALL_RETRIES:
+                delay = get_backoff_delay(attempt, get_retry_after(e))
+                logger.warning(f"Temporary error while analyzing {filepath} (attempt {attempt+1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    raise LLMUnavailableError(f"Failed to analyze {filepath} after {MAX_CALL_RETRIES} retries: {error}")
+
+
+def analyze_with_cascade(client: OpenAI,
+                         filepath: str,
+                         system_prompt: str,
+                         user_prompt: str,
+                         response_format: BaseModel,
+                         convert,
+                         get_doubts,
+                         repo_name: str = None) -> tuple[BaseModel, float]:
+    """
+    Analyze a file with each model of MODEL_CASCADE in turn, starting with the cheapest,
+    until the result is no longer in doubt. If the strongest model fails, the last result is kept.
 
+    Parameters:
+        convert: A function which maps a parsed (compact) response into the result.
+        get_doubts: A function which returns the reasons to doubt a result (which may be None), if any.
+        (The other parameters are passed on to analyze_file_content.)
 
-def analyze_readme(project_cache: ProjectCache, readme) -> tuple[ReadmeAnalysis, float]:
+    Returns:
+        A tuple of (result, cost), where cost is the total cost of the calls to all the models.
+    """
+    result, total_cost = None, 0
+    for tier, model in enumerate(MODEL_CASCADE.models):
+        tier_result, cost = analyze_file_content(client, filepath, system_prompt, user_prompt, response_format, 
+                                                 model, repo_name)
+        total_cost += cost
+        if tier_result is not None:
+            tier_result = convert(tier_result)
+        if tier_result is not None or result is None:
+            result = tier_result
+        # While collecting batch requests there are no results yet, so there is nothing to escalate
+        if BATCH_RUNNER.mode == COLLECT or tier == len(MODEL_CASCADE.models) - 1:
+            break
+        doubts = get_doubts(tier_result)
+        if not doubts:
+            break
+        logger.info(f"Escalating {filepath} from {model} to {MODEL_CASCADE.models[tier+1]}: {', '.join(doubts)}")
+        MODEL_CASCADE.record_escalation(model, doubts)
+    return result, total_cost
+
+
+# The system prompts are kept byte-identical across calls, with all the variable content in the user prompt
+# at the end. OpenAI only caches prompts of at least 1024 tokens, and these prompts are 250-450 tokens, so
+# the shared instructions alone are too short to be cached. Only calls whose prompts share a longer prefix
+# (e.g. a retry of the same file) get cached tokens. Padding the instructions to 1024 tokens would cost more
+# than caching them saves.
+
+# System prompt for analyzing README files
+README_SYSTEM_PROMPT = """\
+You are an expert at analyzing Markdown files from GitHub repositories and extracting structured information about the project.
+Given the content of a README file, you extract the shell (CLI) commands which are necessary to setup the project and run a basic example.
+Extract any prerequisites for running the setup steps and output them in the `p` field.
+Extract the setup steps and output them in the `s` field, with the following guidelines:
+- Break multiline commands into separate steps.
+- Do NOT include commands which are optional or not relevant to setting up the project for a minimal example.
+- If commands are repeated multiple times with different example arguments, you should output those command only once, choosing the best example.
+- If you can't find any setup commands, please output an empty list.
+
+Also, extract the URL to the full documentation for the project (`u`). If it doesn't exist, please output an empty string.
+"""
+
+# System prompt for analyzing code files
+CODE_SYSTEM_PROMPT = """\
+You are an expert in evaluating Python code for API documentation and internal comments.
+You will be given the content of a Python file.
+
+Analyze the module and each function (including methods of classes). Ignore boilerplate code such as constructors.
+
+For each function, give a pass/fail rating for clear naming, type annotations, API documentation, and internal comments.
+
+For clear naming, look at the function name and determine if it is clear and descriptive.
+If the function name is not descriptive, the function should get a fail for clear naming.
+If the function name is descriptive, the function should get a pass for clear naming.
+
+If the function has no docstring, it should get a fail for API documentation.
+If the docstring exists but is missing important details, it should get a fail for API documentation.
+If the docstring exists and is clear and complete, it should get a pass for API documentation.
+
+For internal comments, look at the code and determine if there are enough comments to understand what the function does.
+If there are comments, they should explain the code and be complete.
+If there are no comments or not enough comments, the function should get a fail for internal comments.
+If there are comments and they are clear and complete, the function should get a pass for internal comments.
+
+If any rating of a function is a fail, give a very brief (one sentence) explanation of why in `e`. Otherwise, set `e` to null.
+"""
+
+# System prompt for reviewing code files whose functions were found and checked for type annotations
+# and docstrings locally, so that the LLM only rates the subjective properties
+CODE_REVIEW_SYSTEM_PROMPT = """\
+You are an expert in evaluating Python code for API documentation and internal comments.
+You will be given the content of a Python file, preceded by the list of functions to rate.
+Methods are listed as `Class.method`.
+
+Analyze the module and rate each of the listed functions, using the function names exactly as listed.
+
+For each function, give a pass/fail rating for clear naming, API documentation, and internal comments.
+
+For clear naming, look at the function name and determine if it is clear and descriptive.
+If the function name is not descriptive, the function should get a fail for clear naming.
+If the function name is descriptive, the function should get a pass for clear naming.
+
+If the function has no docstring, it should get a fail for API documentation.
+If the docstring exists but is missing important details, it should get a fail for API documentation.
+If the docstring exists and is clear and complete, it should get a pass for API documentation.
+
+For internal comments, look at the code and determine if there are enough comments to understand what the function does.
+If there are comments, they should explain the code and be complete.
+If there are no comments or not enough comments, the function should get a fail for internal comments.
+If there are comments and they are clear and complete, the function should get a pass for internal comments.
+
+If any rating of a function is a fail, give a very brief (one sentence) explanation of why in `e`. Otherwise, set `e` to null.
+"""
+
+# System prompt for reviewing several small code files in a single call
+PACKED_CODE_REVIEW_SYSTEM_PROMPT = CODE_REVIEW_SYSTEM_PROMPT + """
+You will be given several Python files, each starting with a line of the form `=== File <index>: <path> ===`,
+followed by the list of functions to rate in that file.
+Output one review for each file, in the same order, with `i` set to the index given for that file.
+"""
+
+
+def analyze_readme(client: OpenAI, project_cache: ProjectCache, readme) -> tuple[ReadmeAnalysis, float]:
     """
     Analyze the given README file using the OpenAI API.
 
     Parameters:
+        client: The OpenAI client to use to make the API call.
         project_cache: The project cache to use to find the file.
         readme: The README file to analyze (tuple of (filename, content)).
 
@@ -202,40 +615,18 @@ def analyze_readme(project_cache: ProjectCache, readme) -> tuple[ReadmeAnalysis,
     if not file or not content:
         return default_analysis, 0
 
-    system_prompt = """
-    You are an expert at analyzing Markdown files from GitHub repositories and extracting structured information about the project.
-    Given the content of a README file, you extract the shell (CLI) commands which are necessary to setup the project and run a basic example.
-    Extract any prerequisites for running the setup steps and output them in the `prerequisites` field.
-    Extract the setup steps and output them in the `setup_steps` field, with the following guidelines:
-    - Break multiline commands into separate steps.
-    - Do NOT include commands which are optional or not relevant to setting up the project for a minimal example.
-    - If commands are repeated multiple times with different example arguments, you should output those command only once, choosing the best example.
-    - If you can't find any setup commands, please output an empty list.
-
-    Also, extract the URL to the full documentation for the project (`docs_url`). If it doesn't exist, please output an empty string.
-    """
-
-    user_prompt = f"""
-    README content:
-
-    {content}
-    """
+    user_prompt = f"README content:\n\n{content}"
 
-    client = OpenAI()
-    completion, cost = analyze_file_content(client, project_cache.get_path_in_repo(file), content, system_prompt, user_prompt, ReadmeAnalysis)
-    if completion is None:
+    result, cost = analyze_with_cascade(client, project_cache.get_path_in_repo(file), README_SYSTEM_PROMPT, user_prompt, 
+                                        WireReadmeAnalysis, 
+                                        lambda wire: to_readme_analysis(wire, project_cache.repo_full_name), 
+                                        lambda result: get_readme_doubts(result, content), 
+                                        project_cache.repo_full_name)
+    if result is None:
         return default_analysis, cost
 
-    message = completion.choices[0].message
-    if message.parsed:
-        result = message.parsed
-        result.github_commit_hash = project_cache.get_commit_hash(file) if file else None
-        return result, cost
-    
-    elif message.refusal:
-        logger.info(f"[ERROR] refused to analyze README {project_cache.get_path_in_repo(file)}: {message.refusal}")
-    
-    return default_analysis, cost
+    result.github_commit_hash = project_cache.get_commit_hash(file) if file else None
+    return result, cost
     
 
 def analyze_license(project_cache: ProjectCache, license) -> tuple[LicenseAnalysis, float]:
@@ -259,80 +650,269 @@ def analyze_license(project_cache: ProjectCache, license) -> tuple[LicenseAnalys
     return analysis
 
 
-def analyze_code(project_cache: ProjectCache, code) -> tuple[list[CodeDocumentationAnalysis], float]:
+def merge_chunk_analyses(analyses: list[CodeDocumentationAnalysis]) -> CodeDocumentationAnalysis:
+    """
+    Merge the analyses of the chunks of a single file into one analysis of the whole file. 
+    The high-level documentation is judged from the first chunk, which contains the module header,
+    and counts as missing if the first chunk couldn't be analyzed.
+
+    Returns:
+        The merged analysis, or None if none of the chunks could be analyzed.
     """
-    Analyze the given code files using the OpenAI API.
+    analyzed = [analysis for analysis in analyses if analysis is not None]
+    if not analyzed:
+        return None
+    return CodeDocumentationAnalysis(
+        filepath=analyzed[0].filepath,
+        github_commit_hash=analyzed[0].github_commit_hash,
+        high_level_documentation=analyses[0].high_level_documentation if analyses[0] is not None else False,
+        code_factored=all(analysis.code_factored for analysis in analyzed),
+        function_analysis=[function for analysis in analyzed for function in analysis.function_analysis],
+    )
+
+
+def analyze_code_file(client: OpenAI, 
+                      project_cache: ProjectCache, 
+                      filepath: str, 
+                      file_content: str) -> tuple[CodeDocumentationAnalysis, float]:
     """
-    client = OpenAI()
-    results = []
-    total_cost = 0
-    c = 0
+    Analyze a single code file using the OpenAI API.
+
+    Returns:
+        A tuple of (analysis, cost), where analysis is None if the file could not be analyzed.
+    """
+    logger.info(f"Analyzing code file: {filepath}")
+
+    fullpath = project_cache.get_path_in_repo(filepath)
+    chunks = split_python_source(file_content, MAX_CHUNK_TOKENS)
+
+    def analyze_chunk(chunk: str) -> tuple[CodeDocumentationAnalysis, float]:
+        functions = extract_functions(chunk)
+        if functions is None:
+            # Source which can't be parsed is left entirely to the LLM
+            user_prompt = f"Please analyze the following Python file:\n{chunk}"
+            return analyze_with_cascade(client, fullpath, CODE_SYSTEM_PROMPT, user_prompt, WireCodeAnalysis,
+                                        lambda wire: to_code_analysis(wire, filepath),
+                                        lambda analysis: get_code_analysis_doubts(analysis, chunk), project_cache.repo_full_name)
+
+        user_prompt = f"{format_function_list(functions)}\n\nPlease analyze the following Python file:\n{chunk}"
+        review, cost = analyze_with_cascade(client, fullpath, CODE_REVIEW_SYSTEM_PROMPT, user_prompt, WireCodeReview,
+                                            lambda wire: to_code_review(wire, filepath),
+                                            lambda review: get_code_review_doubts(review, functions), project_cache.repo_full_name)
+        if review is None:
+            return None, cost
+        return build_code_analysis(review, functions), cost
+
+    if len(chunks) == 1:
+        result, cost = analyze_chunk(file_content)
+    else:
+        logger.info(f"Splitting {filepath} into {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=MAX_FILE_JOBS) as executor:
+            chunk_results = list(executor.map(analyze_chunk, chunks))
+        result = merge_chunk_analyses([chunk_result for chunk_result, _ in chunk_results])
+        cost = sum(chunk_cost for _, chunk_cost in chunk_results)
+
+    if result is None:
+        return None, cost
+
+    result.filepath = filepath
+    result.github_commit_hash = project_cache.get_commit_hash(filepath)
+    return result, cost
+
+
+def pack_small_files(code: dict[str, str]) -> list[list[str]]:
+    """
+    Group the small files among the given code files into packs which can be analyzed in a single call.
+    Files which can't be parsed are left out, since they are analyzed differently.
 
+    Returns:
+        A list of packs, each a list of at least two file paths.
+    """
+    packs = []
+    pack, pack_tokens = [], 0
     for filepath, file_content in code.items():
-        logger.info(f"Analyzing code file: {filepath}")
-
-        system_prompt = """
-        You are an expert in evaluating Python code for API documentation and internal comments.
-        You will be given the content of a Python file.
-        
-        Analyze the module and each function (including methods of classes). Ignore boilerplate code such as constructors.
-
-        For each function, give a pass/fail rating for clear naming, type annotations, API documentation, and internal comments.
-
-        For clear naming, look at the function name and determine if it is clear and descriptive.
-        If the function name is not descriptive, the function should get a fail for clear naming.
-        If the function name is descriptive, the function should get a pass for clear naming.
-
-        If the function has no docstring, it should get a fail for API documentation.
-        If the docstring exists but is missing important details, it should get a fail for API documentation.
-        If the docstring exists and is clear and complete, it should get a pass for API documentation.
-
-        For internal comments, look at the code and determine if there are enough comments to understand what the function does.
-        If there are comments, they should explain the code and be complete.
-        If there are no comments or not enough comments, the function should get a fail for internal comments.
-        If there are comments and they are clear and complete, the function should get a pass for internal comments.
-        
-        Provide a very brief (two sentences max) explanation for your rating.
-        """
-
-        user_prompt = f"""
-        Please analyze the following Python file:
-        {file_content}
-        """
-
-        fullpath = project_cache.get_path_in_repo(filepath)
-        completion, cost = analyze_file_content(client, fullpath, file_content, system_prompt, user_prompt, CodeDocumentationAnalysis)
-        if completion is None:
+        tokens = count_tokens(file_content)
+        if tokens >= SMALL_FILE_TOKENS or extract_functions(file_content) is None:
             continue
+        if pack and (pack_tokens + tokens > PACK_MAX_TOKENS or len(pack) >= PACK_MAX_FILES):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(filepath)
+        pack_tokens += tokens
+    packs.append(pack)
+    return [pack for pack in packs if len(pack) > 1]
+
+
+def analyze_code_pack(client: OpenAI, 
+                      project_cache: ProjectCache, 
+                      files: dict[str, str]) -> tuple[dict[str, CodeDocumentationAnalysis], float]:
+    """
+    Analyze several small code files in a single call to the OpenAI API, which saves repeating the system prompt 
+    for each file. Any file which is missing from the response (or whose review is in doubt, when running
+    a model cascade) is analyzed on its own instead.
 
-        total_cost += cost
+    Returns:
+        A tuple of (analyses, cost), where analyses maps each file path to its analysis. Files which could not 
+        be analyzed are omitted.
+    """
+    logger.info(f"Analyzing {len(files)} small code files together: {', '.join(files)}")
+
+    functions = {filepath: extract_functions(file_content) for filepath, file_content in files.items()}
+    file_sections = "\n".join(f"=== File {index}: {filepath} ===\n{format_function_list(functions[filepath])}\n{file_content}" 
+                              for index, (filepath, file_content) in enumerate(files.items()))
+    user_prompt = f"Please analyze the following Python files:\n{file_sections}"
+
+    description = f"{project_cache.get_path_in_repo('')} ({len(files)} files)"
+    result, cost = analyze_file_content(client, description, PACKED_CODE_REVIEW_SYSTEM_PROMPT, 
+                                        user_prompt, WirePackedCodeReview, MODEL_CASCADE.models[0], project_cache.repo_full_name)
+
+    analyses = {}
+    for review in (to_code_reviews(result, list(files)) if result else []):
+        if review.filepath not in analyses:
+            if len(MODEL_CASCADE.models) > 1 and get_code_review_doubts(review, functions[review.filepath]):
+                # Doubtful files go through the cascade on their own
+                continue
+            analysis = build_code_analysis(review, functions[review.filepath])
+            analysis.github_commit_hash = project_cache.get_commit_hash(review.filepath)
+            analyses[review.filepath] = analysis
+
+    if BATCH_RUNNER.mode == COLLECT:
+        # There are no results yet, files are only analyzed separately if the batch doesn't cover them
+        return analyses, cost
+
+    for filepath, file_content in files.items():
+        if filepath not in analyses:
+            logger.debug(f"{filepath} was missing from the packed analysis, analyzing it separately")
+            analysis, file_cost = analyze_code_file(client, project_cache, filepath, file_content)
+            cost += file_cost
+            if analysis is not None:
+                analyses[filepath] = analysis
+
+    return analyses, cost
+
+
+def analyze_code(client: OpenAI, project_cache: ProjectCache, code) -> tuple[list[CodeDocumentationAnalysis], float]:
+    """
+    Analyze the given code files using the OpenAI API. Up to MAX_FILE_JOBS files (or packs of small files, 
+    if PACK_SMALL_FILES is set) are analyzed concurrently, and the results are returned in the same order as 
+    the given files.
+
+    Files with the same content (up to whitespace) as a file which was already analyzed during the run, 
+    in this repository or any other, reuse its analysis instead of being analyzed again. If that analysis 
+    is still in progress, it is waited for.
+    """
+    results = []
+    total_cost = 0
+    c = 0
 
-        message = completion.choices[0].message
-        if message.parsed:
-            if message.parsed.github_commit_hash:
-                logger.warning(f"AI returned a commit hash for {filepath}: {message.parsed.github_commit_hash}")
-            
-            message.parsed.filepath = filepath
-            message.parsed.github_commit_hash = project_cache.get_commit_hash(filepath)
+    # Claim the content of each file, and only analyze the files whose content isn't claimed yet
+    owned, shared = {}, {}
+    for filepath, file_content in code.items():
+        key = get_content_key(file_content)
+        content_future, owner = CONTENT_DEDUP.claim(key)
+        if owner:
+            owned[filepath] = key
+        else:
+            shared[filepath] = content_future
+    owned_code = {filepath: code[filepath] for filepath in owned}
 
-            results.append(message.parsed)
-            c += 1
-        
-        elif message.refusal:
-            logger.info(f"[ERROR] refused to analyze code {fullpath}: {message.refusal}")
+    packs = pack_small_files(owned_code) if PACK_SMALL_FILES else []
+    packed = {filepath for pack in packs for filepath in pack}
 
-        if c > 10:
-            logger.info(f"Analyzed {c} code files")
-            return results, total_cost
+    def analyze_single_file(filepath: str) -> tuple[dict[str, CodeDocumentationAnalysis], float]:
+        analysis, cost = analyze_code_file(client, project_cache, filepath, code[filepath])
+        return ({filepath: analysis} if analysis else {}), cost
 
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_FILE_JOBS) as executor:
+            futures = [executor.submit(analyze_code_pack, client, project_cache, {filepath: code[filepath] for filepath in pack})
+                       for pack in packs]
+            futures += [executor.submit(analyze_single_file, filepath) for filepath in owned_code if filepath not in packed]
+
+            for i, future in enumerate(futures):
+                analyses, cost = future.result()
+                total_cost += cost
+                results.extend(analyses.values())
+                for filepath, analysis in analyses.items():
+                    CONTENT_DEDUP.resolve(owned[filepath], analysis)
+                c += len(analyses)
+
+                if c > 10:
+                    logger.info(f"Analyzed {c} code files")
+                    # Don't start any more calls, but account for the ones already running
+                    for remaining in futures[i+1:]:
+                        if not remaining.cancel():
+                            total_cost += remaining.result()[1]
+                    break
+    except BaseException as e:
+        for key in owned.values():
+            CONTENT_DEDUP.fail(key, e)
+        raise
+    finally:
+        # Files which couldn't be analyzed are left for whoever claims their content next
+        for key in owned.values():
+            CONTENT_DEDUP.resolve(key, None)
+
+    for filepath, content_future in shared.items():
+        analysis = content_future.result()
+        if analysis is None:
+            logger.debug(f"{filepath} has the same content as a file which couldn't be analyzed")
+            continue
+        logger.debug(f"Reusing the analysis of identical content for {filepath}")
+        analysis = analysis.model_copy(deep=True)
+        analysis.filepath = filepath
+        analysis.github_commit_hash = project_cache.get_commit_hash(filepath)
+        results.append(analysis)
+
+    order = {filepath: index for index, filepath in enumerate(code)}
+    results.sort(key=lambda result: order[result.filepath])
     return results, total_cost
 
 
-def process_github_repo(repo: Repository, cache_dir: str, force: bool = False) -> ProjectAnalysis:
+@dataclass
+class RepoWork:
     """
-    Process a GitHub repository, analyzing the README, LICENSE, and code files, 
-    saving the results to the cache directory and returning a ProjectAnalysis object.
+    The state of a single repository as it moves through the processing stages.
+    """
+    repo: Repository
+    project_cache: ProjectCache
+    contributors: list = field(default_factory=list)
+    readme: tuple[str, str] = (None, "")
+    license: tuple[str, str] = (None, "")
+    code: dict[str, str] = field(default_factory=dict)
+    analysis: ProjectAnalysis = None
+    previous_analysis: ProjectAnalysis = None
+    cost: float = 0
+    started: float = field(default_factory=time.monotonic)
+
+
+def get_contributors(repo: Repository) -> list:
+    """
+    Get all the contributors of the given repository, one page at a time. The budget for the first page
+    must already be acquired as part of CALLS_PER_REPO, and each further page acquires its own call.
+    """
+    pages = repo.get_contributors()
+    contributors = []
+    page = 0
+    while True:
+        if page > 0:
+            GITHUB_BUDGET.acquire(get_github_client())
+        items = pages.get_page(page)
+        contributors.extend(items)
+        if len(items) < PER_PAGE:
+            return contributors
+        page += 1
+
+
+def fetch_repo(repo: Repository, cache_dir: str, force: bool = False, journal: RunJournal = None) -> RepoWork:
     """
+    Fetch the GitHub metadata for the given repository and clone or update the local copy.
+    If a journal is given, the reason for skipping the repository is recorded there.
+
+    Returns:
+        The work item for the repository, or None if the repository should be skipped.
+    """
+    started = time.monotonic()
     project_cache = ProjectCache(cache_dir, repo.full_name)
 
     logger.info("=" * 80)
@@ -346,20 +926,74 @@ def process_github_repo(repo: Repository, cache_dir: str, force: bool = False) -
         reason = "fork" if repo.fork else "archived"
         logger.info(f"Skipping {repo.full_name} because it is a {reason}")
         project_cache.remove_existing_analysis()
-        return
+        if journal:
+            journal.record(repo.full_name, SKIPPED, reason=reason, duration=time.monotonic() - started)
+        return None
 
     # Get the contributors
-    contributors = repo.get_contributors()
-    logger.info(f"Contributors: {len(list(contributors))}")
+    GITHUB_BUDGET.acquire(get_github_client(), CALLS_PER_REPO)
+    contributors = get_contributors(repo)
+    logger.info(f"Contributors: {len(contributors)}")
 
     # Fetch changes to the repo
     changed = project_cache.clone_or_update_repo(repo.ssh_url)
     if not changed and project_cache.analysis_exists() and not force:
         logger.info(f"Skipping {repo.full_name} because it hasn't changed since last analysis")
-        return
+        if journal:
+            journal.record(repo.full_name, SKIPPED, reason="unchanged", duration=time.monotonic() - started)
+        return None
+
+    # Unless forced, reuse the parts of the previous analysis for files which haven't changed
+    previous_analysis = None if force else project_cache.load_analysis()
+
+    return RepoWork(repo=repo, project_cache=project_cache, contributors=contributors, 
+                    previous_analysis=previous_analysis, started=started)
+
+
+def collect_repo_content(work: RepoWork) -> RepoWork:
+    """
+    Read the README, LICENSE, and sampled code files from the local copy of the repository.
+    """
+    work.readme, work.license, work.code = collect_content(work.project_cache)
+    return work
+
 
-    readme, license, code = collect_content(project_cache)
-    readme_result, readme_cost = analyze_readme(project_cache, readme)
+def get_unchanged_code_analyses(project_cache: ProjectCache, 
+                                code: dict[str, str], 
+                                previous: ProjectAnalysis) -> dict[str, CodeDocumentationAnalysis]:
+    """
+    Find the code files whose analysis in the previous analysis of the project is still valid, 
+    because no commit has touched them since.
+
+    Returns:
+        A dictionary of the previous analyses of the unchanged files, keyed by file path.
+    """
+    if previous is None:
+        return {}
+    previous_by_path = {analysis.filepath: analysis for analysis in previous.code_analysis}
+    unchanged = {}
+    for filepath in code:
+        analysis = previous_by_path.get(filepath)
+        if analysis and analysis.github_commit_hash and analysis.github_commit_hash == project_cache.get_commit_hash(filepath):
+            unchanged[filepath] = analysis
+    return unchanged
+
+
+def analyze_repo(work: RepoWork) -> RepoWork:
+    """
+    Analyze the collected content of the repository and build its ProjectAnalysis.
+    """
+    repo = work.repo
+    project_cache = work.project_cache
+    previous = work.previous_analysis
+    client = LLM_TRANSPORT.client
+
+    readme_file = work.readme[0]
+    if previous and readme_file and previous.readme_analysis.github_commit_hash == project_cache.get_commit_hash(readme_file):
+        logger.info(f"README unchanged since last analysis of {repo.full_name}")
+        readme_result, readme_cost = previous.readme_analysis, 0
+    else:
+        readme_result, readme_cost = analyze_readme(client, project_cache, work.readme)
 
     if readme_result.setup_steps:
         logger.info("Setup Steps:")
@@ -372,15 +1006,23 @@ def process_github_repo(repo: Repository, cache_dir: str, force: bool = False) -
     logger.info(f"Setup Completeness Score: {readme_result.setup_completeness}")
     logger.info(f"README Quality Score: {readme_result.readme_quality}")
 
-    license_result = analyze_license(project_cache, license)
+    license_result = analyze_license(project_cache, work.license)
     
     if ANALYZE_CODE:
-        code_result, code_cost = analyze_code(project_cache, code)
+        unchanged = get_unchanged_code_analyses(project_cache, work.code, previous)
+        changed_code = {filepath: content for filepath, content in work.code.items() if filepath not in unchanged}
+        if unchanged:
+            logger.info(f"Reusing analysis of {len(unchanged)} unchanged code files, analyzing {len(changed_code)}")
+        new_results, code_cost = analyze_code(client, project_cache, changed_code)
+        new_results = {result.filepath: result for result in new_results}
+        code_result = [unchanged.get(filepath) or new_results[filepath] 
+                       for filepath in work.code if filepath in unchanged or filepath in new_results]
     else:
         code_result, code_cost = [], 0
 
     analysis_cost = readme_cost + code_cost
     logger.info(f"Analysis cost: ${analysis_cost:.4f}")
+    work.cost = analysis_cost
 
     metadata = GithubMetadata(
         repo_name=repo.full_name,
@@ -389,10 +1031,10 @@ def process_github_repo(repo: Repository, cache_dir: str, force: bool = False) -
         stars=repo.stargazers_count,
         forks=repo.forks_count,
         language=repo.language,
-        contributors=[contributor.login for contributor in contributors],
+        contributors=[contributor.login for contributor in work.contributors],
     )
 
-    analysis = ProjectAnalysis(
+    work.analysis = ProjectAnalysis(
         github_metadata=metadata,
         last_commit_date=repo.pushed_at.isoformat(),
         analysis_date=datetime.now().isoformat(),
@@ -402,18 +1044,49 @@ def process_github_repo(repo: Repository, cache_dir: str, force: bool = False) -
         global_scores=GlobalQualityScores(
             setup_completeness=readme_result.setup_completeness,
             readme_quality=readme_result.readme_quality),
+        analysis_cost=analysis_cost,
     )
+    return work
 
-    project_cache.save_analysis_to_file(analysis)
-    return analysis
 
+def save_repo_analysis(work: RepoWork, journal: RunJournal = None) -> ProjectAnalysis:
+    """
+    Save the analysis of the repository to the cache directory, and record it in the journal if one is given.
+    """
+    work.project_cache.save_analysis_to_file(work.analysis)
+    if journal:
+        journal.record(work.repo.full_name, DONE, cost=work.cost, duration=time.monotonic() - work.started)
+    return work.analysis
 
-def process_repo_from_url(repo_url: str, 
-                         cache_dir: str = "cache", 
-                         force: bool = False) -> ProjectAnalysis:
+
+def process_github_repo(repo: Repository, cache_dir: str, force: bool = False, journal: RunJournal = None) -> ProjectAnalysis:
     """
-    Process a GitHub repository given a URL, analyzing the README, LICENSE, and code files, 
+    Process a GitHub repository, analyzing the README, LICENSE, and code files, 
     saving the results to the cache directory and returning a ProjectAnalysis object.
+    If a journal is given, the outcome is recorded there.
+    """
+    work = fetch_repo(repo, cache_dir, force, journal)
+    if work is None:
+        return None
+
+    work = collect_repo_content(work)
+    work = analyze_repo(work)
+    return save_repo_analysis(work, journal)
+
+
+@functools.cache
+def get_github_client() -> Github:
+    """
+    Get the GitHub client authenticated with the GITHUB_TOKEN from the environment. 
+    A single client is shared so that GITHUB_BUDGET sees the rate limit headers of every call.
+    """
+    return Github(auth=Auth.Token(os.getenv("GITHUB_TOKEN")), per_page=PER_PAGE)
+
+
+def get_repo_full_name(repo_url: str) -> str:
+    """
+    Get the full name (e.g. JaneliaSciComp/zarrcade) of a GitHub repository given its SSH or HTTPS URL, 
+    or its full name.
     """
     if repo_url.startswith("git@"):
         # SSH URL
@@ -425,31 +1098,374 @@ def process_repo_from_url(repo_url: str,
         org_repo = repo_url
 
     org_name, repo_name = org_repo.split("/")
-    g = Github(auth=Auth.Token(os.getenv("GITHUB_TOKEN")))
-    repo = g.get_repo(f"{org_name}/{repo_name}")
-    return process_github_repo(repo, cache_dir, force)
+    return f"{org_name}/{repo_name}"
+
+
+def process_repo_from_url(repo_url: str, 
+                         cache_dir: str = "cache", 
+                         force: bool = False,
+                         journal: RunJournal = None) -> ProjectAnalysis:
+    """
+    Process a GitHub repository given a URL, analyzing the README, LICENSE, and code files, 
+    saving the results to the cache directory and returning a ProjectAnalysis object.
+    """
+    g = get_github_client()
+    GITHUB_BUDGET.acquire(g)
+    repo = g.get_repo(get_repo_full_name(repo_url))
+    return process_github_repo_safely(repo, cache_dir, force, journal)
+
+
+def process_github_repo_safely(repo: Repository, 
+                               cache_dir: str, 
+                               force: bool = False, 
+                               journal: RunJournal = None) -> ProjectAnalysis:
+    """
+    Process a GitHub repository, logging and swallowing any errors so that 
+    one failing repository does not abort the processing of the others.
+    """
+    started = time.monotonic()
+    try:
+        return process_github_repo(repo, cache_dir, force, journal)
+    except BudgetExceededError as e:
+        logger.warning(f"Not processing {repo.full_name}: {e}")
+        if journal:
+            journal.record(repo.full_name, FAILED, reason=str(e), duration=time.monotonic() - started)
+        return None
+    except Exception as e:
+        logger.exception(f"Failed to process {repo.full_name}: {e}")
+        if journal:
+            journal.record(repo.full_name, FAILED, reason=str(e), duration=time.monotonic() - started)
+        return None
+
+
+def process_repos(repos: list[Repository], 
+                  cache_dir: str = "cache", 
+                  force: bool = False, 
+                  jobs: int = DEFAULT_JOBS,
+                  journal: RunJournal = None) -> list[ProjectAnalysis]:
+    """
+    Process the given repositories, running up to `jobs` of them concurrently.
+
+    Parameters:
+        repos: The repositories to process.
+        cache_dir: The directory to store analysis cache files.
+        force: Force re-analysis even if existing analysis exists.
+        jobs: The maximum number of repositories to process at once.
+        journal: The run journal in which to record the outcome for each repository.
+
+    Returns:
+        The list of analyses that were produced, in the same order as the given repositories. 
+        Repositories which were skipped or failed are omitted.
+    """
+    if jobs <= 1:
+        results = [process_github_repo_safely(repo, cache_dir, force, journal) for repo in repos]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(lambda repo: process_github_repo_safely(repo, cache_dir, force, journal), repos))
+    return [analysis for analysis in results if analysis is not None]
+
+
+def process_repos_pipelined(repos: list[Repository], 
+                            cache_dir: str = "cache", 
+                            force: bool = False, 
+                            jobs: int = DEFAULT_JOBS,
+                            journal: RunJournal = None) -> list[ProjectAnalysis]:
+    """
+    Process the given repositories with a staged pipeline, so that the next repositories
+    are being cloned and collected while the current ones are waiting on the LLM.
+
+    Parameters:
+        repos: The repositories to process.
+        cache_dir: The directory to store analysis cache files.
+        force: Force re-analysis even if existing analysis exists.
+        jobs: The number of repositories to analyze with the LLM at once.
+        journal: The run journal in which to record the outcome for each repository.
+
+    Returns:
+        The list of analyses that were produced, in order of completion.
+    """
+    def journaled(func):
+        # Record failures in the journal before the pipeline drops the item
+        def run(item):
+            try:
+                return func(item)
+            except Exception as e:
+                if journal:
+                    repo = item if isinstance(item, Repository.Repository) else item.repo
+                    journal.record(repo.full_name, FAILED, reason=str(e))
+                raise
+        return run
+
+    stages = [
+        Stage("fetch", journaled(lambda repo: fetch_repo(repo, cache_dir, force, journal)), workers=PIPELINE_FETCH_WORKERS),
+        Stage("collect", journaled(collect_repo_content), workers=PIPELINE_COLLECT_WORKERS),
+        Stage("analyze", journaled(analyze_repo), workers=jobs),
+        Stage("save", journaled(lambda work: save_repo_analysis(work, journal)), workers=1),
+    ]
+    return run_pipeline(repos, stages)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parse a shard specification of the form i/N, where 0 <= i < N.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected 0 <= i < N")
+    return index, count
+
+
+def in_shard(full_name: str, shard: tuple[int, int]) -> bool:
+    """
+    Check whether the repository with the given full name belongs to the given shard (i, N).
+    Repositories are assigned by a stable hash of their full name, so every process sees the 
+    same partition, and the N shards together cover every repository exactly once. 
+    GitHub names are case-insensitive, so the name is lowercased before hashing.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    digest = hashlib.sha1(full_name.lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index
+
+
+def process_repos_batched(repos: list[Repository], 
+                          cache_dir: str = "cache", 
+                          force: bool = False, 
+                          journal: RunJournal = None) -> list[ProjectAnalysis]:
+    """
+    Process the given repositories using the OpenAI Batch API, which halves the cost of the LLM calls
+    but may take up to a day to complete. The LLM requests for all the repositories are collected 
+    and submitted as batches, and once the batches are done, the analyses are assembled from the results.
+
+    Parameters:
+        repos: The repositories to process.
+        cache_dir: The directory to store analysis cache files.
+        force: Force re-analysis even if existing analysis exists.
+        journal: The run journal in which to record the outcome for each repository.
+
+    Returns:
+        The list of analyses that were produced.
+    """
+    works = []
+    for repo in repos:
+        try:
+            work = fetch_repo(repo, cache_dir, force, journal)
+            if work is not None:
+                works.append(collect_repo_content(work))
+        except Exception as e:
+            logger.exception(f"Failed to process {repo.full_name}: {e}")
+            if journal:
+                journal.record(repo.full_name, FAILED, reason=str(e))
+
+    # Run the analysis once just to collect the requests
+    BATCH_RUNNER.start(COLLECT)
+    try:
+        for work in works:
+            analyze_repo(work)
+    finally:
+        BATCH_RUNNER.stop()
+
+    requests = BATCH_RUNNER.requests
+    estimated_costs = {
+        key: BATCH_DISCOUNT * estimate_cost(sum(estimate_tokens(message["content"]) for message in body["messages"]), 
+                                            EXPECTED_COMPLETION_TOKENS, body["model"])
+        for key, body in requests.items()}
+    estimated_cost = sum(estimated_costs.values())
+    if not COST_BUDGET.reserve(estimated_cost):
+        logger.error(f"Budget of ${COST_BUDGET.max_cost:.2f} can't cover the batch of {len(requests)} requests (about ${estimated_cost:.2f})")
+        if journal:
+            for work in works:
+                journal.record(work.repo.full_name, FAILED, reason="batch exceeds budget")
+        return []
+    # Each request's share of the reservation is settled when its result is used
+    BATCH_RUNNER.set_reservations(estimated_costs)
+
+    if requests:
+        logger.info(f"Submitting {len(requests)} requests for {len(works)} repositories to the Batch API")
+        # Batch API calls aren't retried by request_completion, so let the client retry them
+        client = LLM_TRANSPORT.client.with_options(max_retries=BATCH_API_RETRIES)
+        batch_dir = os.path.join(cache_dir, BATCH_DIR)
+        batch_ids = BATCH_RUNNER.submit(client, BATCH_RUNNER.write_batch_files(batch_dir))
+        batches = BATCH_RUNNER.wait(client, batch_ids)
+        BATCH_RUNNER.load_results(client, batches, batch_dir)
+
+    # Run the analysis again, answering the requests from the batch results
+    analyses = []
+    BATCH_RUNNER.start(ASSEMBLE)
+    try:
+        for work in works:
+            try:
+                analyze_repo(work)
+                analyses.append(save_repo_analysis(work, journal))
+            except Exception as e:
+                logger.exception(f"Failed to process {work.repo.full_name}: {e}")
+                if journal:
+                    journal.record(work.repo.full_name, FAILED, reason=str(e))
+    finally:
+        BATCH_RUNNER.stop()
+        COST_BUDGET.release(BATCH_RUNNER.take_all_reservations())
+
+    return analyses
+
+
+def get_staleness(repo: Repository, cache_dir: str) -> float:
+    """
+    Get how out of date the cached analysis of the given repository is, as the number of seconds 
+    between the last push analyzed and the latest push. Repositories which were never analyzed 
+    are infinitely stale.
+    """
+    analysis = ProjectCache(cache_dir, repo.full_name).load_analysis()
+    if analysis is None:
+        return math.inf
+
+    def as_utc(date: datetime) -> datetime:
+        return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+    analyzed_push = as_utc(datetime.fromisoformat(analysis.last_commit_date))
+    return max(0, (as_utc(repo.pushed_at) - analyzed_push).total_seconds())
+
+
+def sort_by_staleness(repos: list[Repository], cache_dir: str) -> list[Repository]:
+    """
+    Sort the given repositories so that the ones whose analyses are the most out of date come first:
+    never analyzed repositories, then the ones with the longest time since the push that was analyzed.
+    A run which is cut short will then have refreshed the stalest analyses.
+    """
+    staleness = {repo.full_name: get_staleness(repo, cache_dir) for repo in repos}
+    return sorted(repos, key=lambda repo: staleness[repo.full_name], reverse=True)
+
+
+def get_org_repos(org_name: str) -> list[Repository]:
+    """
+    Get all the public repositories in the given organization.
+    """
+    logger.info(f"Fetching repositories in {org_name} organization...")
+    g = get_github_client()
+    GITHUB_BUDGET.acquire(g)
+    org = g.get_organization(org_name)
+    GITHUB_BUDGET.acquire(g, math.ceil(org.public_repos / PER_PAGE))
+    return list(org.get_repos(type='public'))
+
+
+def process_work_queue(work_queue: WorkQueue, 
+                       cache_dir: str = "cache", 
+                       force: bool = False, 
+                       jobs: int = DEFAULT_JOBS,
+                       journal: RunJournal = None) -> int:
+    """
+    Lease repositories from the given work queue and process them until the queue is empty.
+    Several processes, possibly on different machines sharing the cache directory, can work 
+    on the same queue at once.
+
+    Parameters:
+        work_queue: The queue to take repositories from.
+        cache_dir: The directory to store analysis cache files.
+        force: Force re-analysis even if existing analysis exists.
+        jobs: The number of worker threads in this process.
+        journal: The run journal in which to record the outcome for each repository.
+
+    Returns:
+        The number of repositories processed successfully by this process.
+    """
+    g = get_github_client()
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def work(worker_index: int) -> int:
+        worker = f"{worker_prefix}:{worker_index}"
+        processed = 0
+        while (full_name := work_queue.lease(worker)) is not None:
+            try:
+                with work_queue.heartbeat(full_name, worker):
+                    GITHUB_BUDGET.acquire(g)
+                    process_github_repo(g.get_repo(full_name), cache_dir, force, journal)
+            except BudgetExceededError as e:
+                # Leave the repository for a worker with budget left
+                logger.warning(f"Stopping worker {worker}: {e}")
+                if journal:
+                    journal.record(full_name, FAILED, reason=str(e))
+                work_queue.release(full_name, worker)
+                break
+            except Exception as e:
+                logger.exception(f"Failed to process {full_name}: {e}")
+                if journal:
+                    journal.record(full_name, FAILED, reason=str(e))
+                work_queue.release(full_name, worker, failed=True)
+                continue
+            if work_queue.complete(full_name, worker):
+                processed += 1
+        return processed
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        processed = sum(executor.map(work, range(max(1, jobs))))
+
+    logger.info(f"Work queue status: {work_queue.counts()}")
+    return processed
 
 
 def process_all_repos_in_org(org_name: str, 
                              start_repo: str = None, 
                              cache_dir: str = "cache", 
-                             force: bool = False) -> list[ProjectAnalysis]:
+                             force: bool = False,
+                             jobs: int = DEFAULT_JOBS,
+                             pipeline: bool = False,
+                             shard: tuple[int, int] = None,
+                             journal: RunJournal = None,
+                             order: str = ORDER_GITHUB,
+                             batch: bool = False) -> list[ProjectAnalysis]:
     """
     Process all the repositories in the given organization, saving the results to the cache directory and returning a list of ProjectAnalysis objects.
+    Up to `jobs` repositories are processed concurrently. If `pipeline` is set, the repositories are 
+    processed with a staged pipeline instead (see process_repos_pipelined). If `shard` is given as (i, N), 
+    only the repositories in the i-th of N shards are processed. If a journal is given, the outcome for 
+    each repository is recorded there, and repositories which the journal shows as finished are not processed again.
+    The repositories are processed in the order returned by GitHub, unless `order` is ORDER_STALENESS, in which case
+    the most out of date analyses are refreshed first. If `batch` is set, the LLM calls are made through 
+    the Batch API (see process_repos_batched).
     """
-    logger.info(f"Fetching repositories in {org_name} organization...")
-    g = Github(auth=Auth.Token(os.getenv("GITHUB_TOKEN")))
-    repos = list(g.get_organization(org_name).get_repos(type='public'))
+    repos = get_org_repos(org_name)
     
-    start_processing = start_repo is None
-    for repo in repos:
-        if not start_processing:
-            if repo.full_name == start_repo:
-                start_processing = True
-            else:
-                continue
-        
-        process_github_repo(repo, cache_dir, force)
+    if start_repo is not None:
+        names = [repo.full_name for repo in repos]
+        if start_repo in names:
+            repos = repos[names.index(start_repo):]
+        else:
+            repos = []
+
+    repos = [repo for repo in repos if in_shard(repo.full_name, shard)]
+
+    if journal:
+        unfinished = [repo for repo in repos if not journal.is_finished(repo.full_name)]
+        if len(unfinished) < len(repos):
+            logger.info(f"Resuming run {journal.run_id}: {len(repos) - len(unfinished)} repositories already finished")
+        repos = unfinished
+
+    if order == ORDER_STALENESS:
+        repos = sort_by_staleness(repos, cache_dir)
+
+    GITHUB_BUDGET.log_estimate(get_github_client(), len(repos) * CALLS_PER_REPO)
+
+    if batch:
+        return process_repos_batched(repos, cache_dir, force, journal)
+    if pipeline:
+        return process_repos_pipelined(repos, cache_dir, force, jobs, journal)
+    return process_repos(repos, cache_dir, force, jobs, journal)
+
+
+def get_scan_parameters(args: argparse.Namespace) -> dict:
+    """
+    Get the parameters which determine the repositories processed by a scan, to tell apart the runs
+    of different scans (e.g. the shards of an org) which share a cache directory.
+    """
+    return {
+        "orgs": None if args.repos else args.orgs,
+        "repos": args.repos,
+        "shard": f"{args.shard[0]}/{args.shard[1]}" if args.shard else None,
+        "queue": args.queue,
+    }
 
 
 if __name__ == "__main__":
@@ -460,13 +1476,103 @@ if __name__ == "__main__":
     parser.add_argument("--repos", type=str, help="Process all the listed repositories (comma separated list of full names, e.g. JaneliaSciComp/zarrcade)")
     parser.add_argument("--orgs", type=str, help="Process all repositories in these organizations (comma separated list)", default="JaneliaSciComp")
     parser.add_argument("--start", type=str, help="When running with --orgs, start processing from this repository name (full name, e.g. JaneliaSciComp/colormipsearch)")
+    parser.add_argument("--order", choices=[ORDER_GITHUB, ORDER_STALENESS], default=ORDER_GITHUB, help="When running with --orgs, the order in which to process repositories: as listed by GitHub (default), or the most out of date analyses first")
+    parser.add_argument("--resume", nargs="?", const=RESUME_LATEST, metavar="RUN_ID", 
+                        help="Resume the given run, or by default the most recent run of the same scan (orgs, repos and shard), retrying only the repositories which failed or didn't finish")
     parser.add_argument("--force", action="store_true", help="Force re-analysis even if existing analysis exists")
     parser.add_argument("--cache-dir", type=str, help="Directory to store analysis cache files", default="cache")
+    parser.add_argument("--jobs", type=int, help="When running with --orgs, process this many repositories concurrently", default=DEFAULT_JOBS)
+    parser.add_argument("--pipeline", action="store_true", help="When running with --orgs, overlap cloning, collection, and analysis of different repositories in a staged pipeline")
+    parser.add_argument("--no-response-cache", action="store_true", help="Always call the LLM, even for content which was already analyzed with the same prompts")
+    parser.add_argument("--max-cost", type=float, help="Stop making OpenAI calls once this many dollars have been spent in the run")
+    parser.add_argument("--max-rpm", type=int, help="Never send more than this many OpenAI requests per minute, even if the account allows more")
+    parser.add_argument("--max-tpm", type=int, help="Never send more than this many OpenAI tokens per minute, even if the account allows more")
+    parser.add_argument("--llm-timeout", type=float, help=f"Give up on an OpenAI call after this many seconds without a response (default {LLM_TRANSPORT.read_timeout})")
+    parser.add_argument("--cascade", nargs="?", const=CASCADE_MODEL, metavar="MODEL",
+                        help=f"Analyze with the backend's model first, and re-analyze doubtful results with a stronger model (default {CASCADE_MODEL})")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=LLM_BACKEND.name, help=f"The LLM API to use: OpenAI (default), or a local OpenAI-compatible server")
+    parser.add_argument("--llm-base-url", type=str, help="Override the base URL of the backend's API (e.g. http://localhost:8000/v1)")
+    parser.add_argument("--llm-model", type=str, help="Override the backend's model")
+    parser.add_argument("--llm-concurrency", type=int, help="Override the backend's maximum number of LLM calls in flight")
+    parser.add_argument("--no-telemetry", action="store_true", help="Don't record the telemetry of each LLM call in the cache directory")
+    parser.add_argument("--shard", type=parse_shard, help="Only process the repositories in shard i of N (e.g. 0/4), so that N processes can split up a scan")
+    parser.add_argument("--pack", action="store_true", help="Analyze several small code files together in a single LLM call")
+    parser.add_argument("--batch", action="store_true", help="When running with --orgs, make the LLM calls through the OpenAI Batch API, which is cheaper but may take up to a day")
+    parser.add_argument("--queue", action="store_true", help="Share the work with other processes using a work queue in the cache directory")
+    parser.add_argument("--queue-worker", action="store_true", help="With --queue, only work on repositories which are already queued")
+    parser.add_argument("--reset-queue", action="store_true", help="With --queue, re-queue repositories which were already processed or failed")
     args = parser.parse_args()
 
-    if args.repos:
+    overrides = {"base_url": args.llm_base_url, "model": args.llm_model, "max_concurrent_calls": args.llm_concurrency}
+    LLM_BACKEND = dataclasses.replace(BACKENDS[args.backend], **{k: v for k, v in overrides.items() if v is not None})
+    if args.batch and not LLM_BACKEND.batch_api:
+        parser.error(f"The {LLM_BACKEND.name} backend doesn't support --batch")
+    for model in filter(None, [LLM_BACKEND.model, args.cascade]):
+        if not LLM_BACKEND.has_pricing(model):
+            # Counting its calls as free would defeat --max-cost
+            parser.error(f"No pricing for model {model} on the {LLM_BACKEND.name} backend, "
+                         f"known models are: {', '.join(LLM_BACKEND.pricing)}")
+    logger.info(f"Using the {LLM_BACKEND.name} backend with model {LLM_BACKEND.model}")
+    LLM_CALL_SEMAPHORE = threading.BoundedSemaphore(LLM_BACKEND.max_concurrent_calls)
+    LLM_TRANSPORT.configure(base_url=LLM_BACKEND.base_url, 
+                            api_key=LLM_BACKEND.get_api_key(), 
+                            max_connections=LLM_BACKEND.max_concurrent_calls, 
+                            read_timeout=args.llm_timeout)
+    if not LLM_BACKEND.rate_limited and not (args.max_rpm or args.max_tpm):
+        RATE_LIMITER.disable()
+    MODEL_CASCADE.set_models([LLM_BACKEND.model, args.cascade] if args.cascade else [LLM_BACKEND.model])
+
+    RATE_LIMITER.set_limits(args.max_rpm, args.max_tpm)
+    COST_BUDGET.set_max_cost(args.max_cost)
+    PACK_SMALL_FILES = args.pack
+    if not args.no_response_cache:
+        RESPONSE_CACHE = ResponseCache(args.cache_dir)
+
+    scan = get_scan_parameters(args)
+    journal = None
+    if args.resume == RESUME_LATEST:
+        journal = RunJournal.latest(args.cache_dir, scan)
+        if journal is None:
+            logger.warning("No previous run of the same scan to resume, starting a new run")
+    elif args.resume:
+        journal = RunJournal.open(args.cache_dir, args.resume)
+        if journal is None:
+            parser.error(f"No run {args.resume} to resume in {args.cache_dir}")
+        if journal.scan != scan:
+            logger.warning(f"Resuming run {args.resume}, which was a different scan: {journal.scan}")
+    if journal is None:
+        journal = RunJournal(args.cache_dir, scan=scan)
+    logger.info(f"Recording run {journal.run_id} in {journal.path}")
+    if not args.no_telemetry:
+        TELEMETRY = TelemetryStore(args.cache_dir, journal.run_id)
+
+    if args.queue:
+        work_queue = WorkQueue(args.cache_dir)
+        if not args.queue_worker:
+            if args.repos:
+                full_names = [get_repo_full_name(repo) for repo in args.repos.split(",")]
+            else:
+                full_names = [repo.full_name for org in args.orgs.split(",") for repo in get_org_repos(org)]
+            full_names = [full_name for full_name in full_names if in_shard(full_name, args.shard)]
+            added = work_queue.enqueue(full_names, reset=args.reset_queue)
+            logger.info(f"Queued {added} repositories")
+            GITHUB_BUDGET.log_estimate(get_github_client(), len(full_names) * (CALLS_PER_REPO + 1))
+        process_work_queue(work_queue, cache_dir=args.cache_dir, force=args.force, jobs=args.jobs, journal=journal)
+    elif args.repos:
         for repo in args.repos.split(","):
-            process_repo_from_url(repo, cache_dir=args.cache_dir, force=args.force)
+            if in_shard(get_repo_full_name(repo), args.shard) and not journal.is_finished(get_repo_full_name(repo)):
+                process_repo_from_url(repo, cache_dir=args.cache_dir, force=args.force, journal=journal)
     else:
         for org in args.orgs.split(","):
-            process_all_repos_in_org(org, start_repo=args.start, cache_dir=args.cache_dir, force=args.force)
+            process_all_repos_in_org(org, start_repo=args.start, cache_dir=args.cache_dir, force=args.force, jobs=args.jobs, pipeline=args.pipeline, shard=args.shard, journal=journal, order=args.order, batch=args.batch)
+
+    logger.info(f"Run {journal.run_id} summary: {journal.summary()}")
+    logger.info(f"Total LLM cost: ${COST_BUDGET.spent:.4f}")
+    MODEL_CASCADE.log_summary()
+    CONTENT_DEDUP.log_summary()
+    if COST_BUDGET.prompt_tokens:
+        logger.info(f"Prompt cache: {COST_BUDGET.cached_tokens} of {COST_BUDGET.prompt_tokens} prompt tokens cached "
+                    f"({COST_BUDGET.cached_tokens / COST_BUDGET.prompt_tokens:.0%})")
+    if RESPONSE_CACHE:
+        logger.info(f"Response cache: {RESPONSE_CACHE.hits} hits, {RESPONSE_CACHE.misses} misses")
+    LLM_TRANSPORT.close()
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import threading
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+RESPONSE_CACHE_DIR = "llm_cache"
+
+# Maximum total size of the cached responses, beyond which the least recently used are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# When evicting, remove entries until the cache is down to this fraction of the maximum
+EVICT_TO_FRACTION = 0.9
+
+
+def hash_text(text: str) -> str:
+    """
+    Get the SHA-256 hex digest of the given text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A persistent cache of parsed LLM responses, stored in the cache directory. Entries are addressed by
+    the hash of everything that determines the response: the model, the system prompt, the response schema,
+    and the user prompt (which carries the file content). Identical content is therefore only ever sent
+    to the API once, even if other files in the repository have changed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_path = os.path.join(cache_dir, RESPONSE_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_path, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+
+    @staticmethod
+    def get_key(model: str, system_prompt: str, response_format: type[BaseModel], user_prompt: str) -> str:
+        """
+        Get the cache key for a call with the given parameters.
+        """
+        schema = json.dumps(response_format.model_json_schema(), sort_keys=True)
+        parts = [model, hash_text(system_prompt), hash_text(schema), hash_text(user_prompt)]
+        return hash_text("\n".join(parts))
+
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, key[:2], f"{key}.json")
+
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        """
+        List the (path, last used time, size) of every entry in the cache.
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_path):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+    def get(self, key: str, response_format: type[BaseModel]) -> BaseModel:
+        """
+        Get the cached response for the given key, or None if it isn't cached.
+        """
+        path = self._get_entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = response_format.model_validate_json(f.read())
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        except (ValidationError, OSError) as e:
+            logger.warning(f"Ignoring broken response cache entry {path}: {e}")
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return result
+
+
+    def put(self, key: str, result: BaseModel):
+        """
+        Store the given response under the given key, evicting the least recently used entries if the cache is full.
+        """
+        path = self._get_entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = result.model_dump_json()
+        # Write atomically so that concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(content.encode("utf-8"))
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache is under its size limit. Must be called with the lock held.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.total_bytes = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        removed = 0
+        for path, _, size in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            removed += 1
+        logger.debug(f"Evicted {removed} entries from the response cache")
@@ -0,0 +1,156 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import openai
+from loguru import logger
+
+# Delay before the first retry of a failed call, which doubles with every further attempt
+BACKOFF_BASE_SECONDS = 2
+
+# Longest delay between two attempts of a call
+BACKOFF_MAX_SECONDS = 120
+
+# Number of consecutive failed calls, across all workers, after which the provider is considered down
+BREAKER_FAILURE_THRESHOLD = 5
+
+# How long to stop all calls once the provider is considered down. The pause doubles each time
+# a trial call fails, up to the maximum.
+BREAKER_COOLDOWN_SECONDS = 30
+BREAKER_MAX_COOLDOWN_SECONDS = 600
+
+# HTTP statuses which indicate a temporary problem on the provider's side
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when an LLM call still fails with a temporary error after all its retries, so that the repository
+    is recorded as failed and retried in a later run, instead of being saved with missing analyses.
+    """
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check if the given error from an LLM call is temporary (timeouts, connection errors, rate limits and
+    server errors), so that the same call may succeed if it is retried. Any other error, such as a bad
+    request or a response which can't be parsed, would fail again.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def get_retry_after(error: Exception) -> float:
+    """
+    Get the number of seconds the server asked us to wait before retrying, from the Retry-After
+    (in seconds or as an HTTP date) or retry-after-ms headers of the error's response.
+
+    Returns:
+        The number of seconds, or None if the server didn't say.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Get the delay before retrying a call after the given number of failed attempts, using exponential
+    backoff with full jitter so that workers which failed together don't all retry at the same moment.
+    If the server asked for a longer delay, that is used instead.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX_SECONDS))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Stops all LLM calls while the provider appears to be down, instead of letting every worker burn through
+    its retries and fail one repository after another.
+
+    The breaker opens after BREAKER_FAILURE_THRESHOLD consecutive failed calls. While it is open, callers wait.
+    Once the cooldown has passed, a single trial call is let through: if it succeeds, the breaker closes and
+    everyone resumes, and if it fails, the breaker opens again for twice as long.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS):
+        self.condition = threading.Condition()
+        self.failure_threshold = failure_threshold
+        self.base_cooldown_seconds = cooldown_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.open_until = None
+        self.trial_running = False
+
+
+    def wait(self):
+        """
+        Wait until calls are allowed. When the cooldown is over, only one caller is let through to make
+        the trial call, and the others keep waiting for its outcome.
+        """
+        with self.condition:
+            while self.open_until is not None:
+                now = time.monotonic()
+                if now >= self.open_until and not self.trial_running:
+                    self.trial_running = True
+                    logger.info("Trying a call to see if the LLM provider has recovered")
+                    return
+                timeout = self.open_until - now if now < self.open_until else None
+                self.condition.wait(timeout=timeout)
+
+
+    def record_success(self):
+        """
+        Record a successful call, which closes the breaker if it was open.
+        """
+        with self.condition:
+            if self.open_until is not None:
+                logger.info("LLM provider has recovered, resuming calls")
+            self.failures = 0
+            self.open_until = None
+            self.trial_running = False
+            self.cooldown_seconds = self.base_cooldown_seconds
+            self.condition.notify_all()
+
+
+    def record_failure(self):
+        """
+        Record a call which failed with a temporary error, opening the breaker if there were too many in a row.
+        """
+        with self.condition:
+            self.failures += 1
+            if self.trial_running:
+                self.trial_running = False
+                self.cooldown_seconds = min(self.cooldown_seconds * 2, BREAKER_MAX_COOLDOWN_SECONDS)
+            elif self.open_until is not None or self.failures < self.failure_threshold:
+                return
+            self.open_until = time.monotonic() + self.cooldown_seconds
+            logger.warning(f"LLM provider appears to be down after {self.failures} failed calls, "
+                           f"pausing all calls for {self.cooldown_seconds:.0f}s")
+            self.condition.notify_all()
@@ -0,0 +1,146 @@
+import os
+import json
+import uuid
+import threading
+from datetime import datetime
+
+from loguru import logger
+
+JOURNAL_DIR = "runs"
+
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# Statuses which don't need to be retried when a run is resumed
+FINISHED_STATUSES = (DONE, SKIPPED)
+
+
+def new_run_id() -> str:
+    """
+    Make a new run id, which sorts by the time the run started. The random suffix keeps the ids of runs
+    started in the same second (e.g. shards started together by cron) apart.
+    """
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class RunJournal:
+    """
+    An append-only journal of the outcome for each repository processed during a run,
+    stored as a JSON lines file in the cache directory. It allows an interrupted run to be
+    resumed, retrying only the repositories which failed or never finished.
+
+    The first line of the journal records the parameters of the scan (e.g. the orgs, repos and shard),
+    so that a run is only resumed by a scan of the same repositories.
+    """
+
+    def __init__(self, cache_dir: str, run_id: str = None, scan: dict = None):
+        self.journal_dir = os.path.join(cache_dir, JOURNAL_DIR)
+        self.run_id = run_id or new_run_id()
+        self.path = os.path.join(self.journal_dir, f"{self.run_id}.jsonl")
+        self.lock = threading.Lock()
+        self.scan = None
+        self.entries = self._load()
+        if scan is not None and not os.path.exists(self.path):
+            self._write({"scan": scan})
+            self.scan = scan
+
+
+    @classmethod
+    def open(cls, cache_dir: str, run_id: str) -> "RunJournal":
+        """
+        Open the journal of the given run, or None if it doesn't exist.
+        """
+        journal = cls(cache_dir, run_id)
+        return journal if os.path.exists(journal.path) else None
+
+
+    @classmethod
+    def latest(cls, cache_dir: str, scan: dict = None) -> "RunJournal":
+        """
+        Open the most recent journal in the given cache directory whose scan parameters are the given ones
+        (or any journal, if scan is None), or None if there isn't one.
+        """
+        journal_dir = os.path.join(cache_dir, JOURNAL_DIR)
+        if not os.path.isdir(journal_dir):
+            return None
+        run_ids = sorted(file[:-len(".jsonl")] for file in os.listdir(journal_dir) if file.endswith(".jsonl"))
+        for run_id in reversed(run_ids):
+            journal = cls(cache_dir, run_id)
+            if scan is None or journal.scan == scan:
+                return journal
+        return None
+
+
+    def _load(self) -> dict[str, dict]:
+        """
+        Load the scan parameters and the latest entry for each repository from the journal file, if it exists.
+        """
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be incomplete if the run was killed while writing it
+                        logger.warning(f"Ignoring corrupt line in run journal {self.path}")
+                        continue
+                    if "scan" in entry:
+                        self.scan = entry["scan"]
+                    else:
+                        entries[entry["repo"]] = entry
+        return entries
+
+
+    def _write(self, entry: dict):
+        """
+        Append an entry to the journal file.
+        """
+        with self.lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+    def record(self, repo_name: str, status: str, reason: str = "", cost: float = 0, duration: float = 0):
+        """
+        Record the outcome of processing the given repository.
+
+        Parameters:
+            repo_name: The full name of the repository.
+            status: One of DONE, FAILED, or SKIPPED.
+            reason: Why the repository was skipped or failed.
+            cost: The dollar cost of the LLM calls made for the repository.
+            duration: The number of seconds spent processing the repository.
+        """
+        entry = {
+            "repo": repo_name,
+            "status": status,
+            "reason": reason,
+            "cost": cost,
+            "duration": round(duration, 3),
+            "time": datetime.now().isoformat(),
+        }
+        self._write(entry)
+        with self.lock:
+            self.entries[repo_name] = entry
+
+
+    def is_finished(self, repo_name: str) -> bool:
+        """
+        Check whether the given repository was already processed or skipped during this run.
+        """
+        entry = self.entries.get(repo_name)
+        return entry is not None and entry["status"] in FINISHED_STATUSES
+
+
+    def summary(self) -> dict[str, int]:
+        """
+        Get the number of repositories with each status, along with the total cost.
+        """
+        summary = {DONE: 0, FAILED: 0, SKIPPED: 0}
+        for entry in self.entries.values():
+            summary[entry["status"]] += 1
+        summary["cost"] = sum(entry["cost"] for entry in self.entries.values())
+        return summary
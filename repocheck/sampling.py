@@ -0,0 +1,72 @@
+import math
+import hashlib
+from collections import defaultdict
+
+
+def hash_fraction(path: str) -> float:
+    """
+    Map the given path to a number in (0, 1) which is stable across runs and machines.
+    """
+    value = int.from_bytes(hashlib.sha1(path.encode("utf-8")).digest()[:8], "big")
+    return (value + 1) / (2**64 + 1)
+
+
+def get_weight(size: int) -> float:
+    """
+    Get the sampling weight of a file with the given size in bytes. Larger files are more likely to be
+    sampled, in proportion to the square root of their size. The size is rounded to a power of two first,
+    so that small edits to a file don't change its weight and reshuffle the sample.
+    """
+    return math.sqrt(2 ** max(1, size.bit_length()))
+
+
+def get_sort_key(path: str, size: int) -> float:
+    """
+    Get the key to rank the given file by, where lower keys are sampled first. This is weighted random
+    sampling (Efraimidis-Spirakis) with the randomness taken from a hash of the path, so the key of a file
+    only depends on the file itself.
+    """
+    return -math.log(hash_fraction(path)) / get_weight(size)
+
+
+def get_stratum(path: str) -> str:
+    """
+    Get the stratum of the given relative path, which is its top-level directory (or "" for files at the top level).
+    """
+    parts = path.split("/", 1)
+    return parts[0] if len(parts) > 1 else ""
+
+
+def sample_files(sizes: dict[str, int], max_files: int) -> list[str]:
+    """
+    Deterministically sample up to max_files files, weighted by size and stratified across top-level directories.
+
+    Each stratum ranks its files by get_sort_key, and the sample takes the first file of every stratum, then the
+    second, and so on, with the best ranked files first within each round. Since a file's rank only depends on
+    its own path and size, adding or removing unrelated files can displace at most one file of the sample,
+    instead of reshuffling it.
+
+    Parameters:
+        sizes: Maps the relative path of each candidate file to its size in bytes.
+        max_files: The maximum number of files to sample.
+
+    Returns:
+        The sampled paths, sorted.
+    """
+    if len(sizes) <= max_files:
+        return sorted(sizes)
+
+    strata = defaultdict(list)
+    for path, size in sizes.items():
+        strata[get_stratum(path)].append((get_sort_key(path, size), path))
+    for ranked in strata.values():
+        ranked.sort()
+
+    sample = []
+    for depth in range(max(len(ranked) for ranked in strata.values())):
+        round_files = sorted(ranked[depth] for ranked in strata.values() if depth < len(ranked))
+        for _, path in round_files:
+            if len(sample) == max_files:
+                return sorted(sample)
+            sample.append(path)
+    return sorted(sample)
@@ -0,0 +1,192 @@
+import os
+import json
+import argparse
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+from loguru import logger
+
+TELEMETRY_DIR = "telemetry"
+
+# Where the result of a call came from
+SOURCE_API = "api"
+SOURCE_CACHE = "cache"
+SOURCE_BATCH = "batch"
+
+# Outcomes of a call
+STATUS_OK = "ok"
+STATUS_REFUSED = "refused"
+STATUS_FAILED = "failed"
+
+# Percentiles shown by the summary
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class CallRecord:
+    """
+    The telemetry of a single LLM call (or of a result taken from the response cache or a batch).
+
+    Attributes:
+        repo: The full name of the repository.
+        file: The file (or pack of files) being analyzed.
+        model: The model which was called.
+        source: Where the result came from (SOURCE_API, SOURCE_CACHE or SOURCE_BATCH).
+        status: The outcome (STATUS_OK, STATUS_REFUSED or STATUS_FAILED).
+        latency: Seconds taken by the API request which succeeded (or the last one which failed).
+        wait: Seconds spent waiting for the rate limiter, circuit breaker, concurrency limit and retry backoff.
+        retries: Number of attempts which failed before the last one.
+    """
+    repo: str
+    file: str
+    model: str
+    source: str = SOURCE_API
+    status: str = STATUS_OK
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency: float = 0.0
+    wait: float = 0.0
+    retries: int = 0
+    cost: float = 0.0
+
+
+class TelemetryStore:
+    """
+    An append-only store of the telemetry of every LLM call made during a run, stored as a JSON lines file
+    per run in the cache directory, next to the run journals.
+    """
+
+    def __init__(self, cache_dir: str, run_id: str):
+        self.telemetry_dir = os.path.join(cache_dir, TELEMETRY_DIR)
+        self.run_id = run_id
+        self.path = os.path.join(self.telemetry_dir, f"{run_id}.jsonl")
+        self.lock = threading.Lock()
+
+
+    def record(self, call: CallRecord):
+        """
+        Append the telemetry of a call to the store.
+        """
+        entry = asdict(call)
+        entry["latency"] = round(call.latency, 3)
+        entry["wait"] = round(call.wait, 3)
+        entry["run_id"] = self.run_id
+        entry["time"] = datetime.now().isoformat()
+        with self.lock:
+            os.makedirs(self.telemetry_dir, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def load_entries(cache_dir: str, run_id: str = None) -> list[dict]:
+    """
+    Load the telemetry entries of the given run, or of every run if run_id is None.
+    """
+    telemetry_dir = os.path.join(cache_dir, TELEMETRY_DIR)
+    if not os.path.isdir(telemetry_dir):
+        return []
+    files = sorted(file for file in os.listdir(telemetry_dir) if file.endswith(".jsonl"))
+    if run_id:
+        files = [file for file in files if file == f"{run_id}.jsonl"]
+
+    entries = []
+    for file in files:
+        with open(os.path.join(telemetry_dir, file), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the run was killed while writing it
+                    logger.warning(f"Ignoring corrupt line in telemetry file {file}")
+    return entries
+
+
+def get_latest_run_id(cache_dir: str) -> str:
+    """
+    Get the id of the most recent run with telemetry, or None if there isn't one.
+    """
+    telemetry_dir = os.path.join(cache_dir, TELEMETRY_DIR)
+    if not os.path.isdir(telemetry_dir):
+        return None
+    run_ids = sorted(file[:-len(".jsonl")] for file in os.listdir(telemetry_dir) if file.endswith(".jsonl"))
+    return run_ids[-1] if run_ids else None
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Get the given percentile of the values, using the nearest-rank method.
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def print_summary(entries: list[dict], top: int):
+    """
+    Print the number of calls by source and status, the percentiles of latency, tokens and cost of the API calls,
+    and the repositories and files which took the longest and cost the most.
+    """
+    by_source = defaultdict(int)
+    by_status = defaultdict(int)
+    for entry in entries:
+        by_source[entry["source"]] += 1
+        by_status[entry["status"]] += 1
+    print(f"{len(entries)} calls: " + ", ".join(f"{count} {source}" for source, count in sorted(by_source.items())))
+    print("Outcomes: " + ", ".join(f"{count} {status}" for status, count in sorted(by_status.items())))
+
+    calls = [entry for entry in entries if entry["source"] != SOURCE_CACHE]
+    if not calls:
+        return
+    total_cost = sum(entry["cost"] for entry in calls)
+    prompt_tokens = sum(entry["prompt_tokens"] for entry in calls)
+    cached_tokens = sum(entry["cached_tokens"] for entry in calls)
+    print(f"Total cost: ${total_cost:.4f}, retries: {sum(entry['retries'] for entry in calls)}, "
+          f"cached prompt tokens: {cached_tokens / prompt_tokens if prompt_tokens else 0:.0%}")
+
+    print()
+    print(f"{'':<20}" + "".join(f"{f'p{p}':>12}" for p in PERCENTILES) + f"{'max':>12}")
+    for field in ("latency", "wait", "prompt_tokens", "completion_tokens", "cost"):
+        values = [entry[field] for entry in calls]
+        row = [percentile(values, p) for p in PERCENTILES] + [max(values)]
+        print(f"{field:<20}" + "".join(f"{value:>12.4g}" for value in row))
+
+    repos = defaultdict(lambda: {"calls": 0, "latency": 0.0, "cost": 0.0})
+    for entry in calls:
+        repo = repos[entry["repo"]]
+        repo["calls"] += 1
+        repo["latency"] += entry["latency"]
+        repo["cost"] += entry["cost"]
+
+    for field in ("cost", "latency"):
+        print()
+        print(f"Top {top} repositories by total {field}:")
+        for name, repo in sorted(repos.items(), key=lambda item: item[1][field], reverse=True)[:top]:
+            print(f"  {name}: {repo['calls']} calls, {repo['latency']:.1f}s, ${repo['cost']:.4f}")
+
+        print()
+        print(f"Top {top} files by {field}:")
+        for entry in sorted(calls, key=lambda entry: entry[field], reverse=True)[:top]:
+            print(f"  {entry['file']} ({entry['model']}): {entry['latency']:.1f}s, "
+                  f"{entry['prompt_tokens']}+{entry['completion_tokens']} tokens, ${entry['cost']:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the telemetry of the LLM calls made by repocheck runs.")
+    parser.add_argument("--cache-dir", type=str, help="Directory to store analysis cache files", default="cache")
+    parser.add_argument("--run", type=str, help="Summarize the run with this id (default: the most recent run)")
+    parser.add_argument("--all", action="store_true", help="Summarize all runs together")
+    parser.add_argument("--top", type=int, default=10, help="Number of repositories and files to list as the slowest and most expensive")
+    args = parser.parse_args()
+
+    run_id = None if args.all else (args.run or get_latest_run_id(args.cache_dir))
+    entries = load_entries(args.cache_dir, run_id)
+    if not entries:
+        print("No telemetry found")
+    else:
+        print(f"Run {run_id}" if run_id else "All runs")
+        print_summary(entries, args.top)
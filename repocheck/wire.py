@@ -0,0 +1,131 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from repocheck.model import (Prerequisite, ShellCommand, ReadmeAnalysis, FunctionAnalysis,
+                             CodeDocumentationAnalysis, FunctionReview, CodeReview)
+
+# Compact response schemas for the LLM calls. Completion tokens are the slowest part of each call, so the model
+# answers with short keys, leaves out anything we already know (file paths, commit hashes), and only explains
+# failing ratings. The responses are mapped back into the classes in repocheck.model after parsing.
+
+
+class WirePrerequisite(BaseModel):
+    """ Compact Prerequisite
+    """
+    d: str = Field(description="A brief description of the prerequisite")
+    u: str = Field(description="The URL to the full documentation for installing the prerequisite")
+
+
+class WireShellCommand(BaseModel):
+    """ Compact ShellCommand
+    """
+    d: str = Field(description="A brief description of the command")
+    c: str = Field(description="The shell command, as it would be typed in the terminal")
+
+
+class WireReadmeAnalysis(BaseModel):
+    """ Compact ReadmeAnalysis
+    """
+    p: list[WirePrerequisite] = Field(description="The prerequisites for running the setup steps")
+    s: list[WireShellCommand] = Field(description="The shell commands which build/install/run the project")
+    sc: int = Field(description="Score from 0 to 5 for how complete the setup steps are")
+    q: int = Field(description="Score from 0 to 5 for how well the README is written")
+    u: Optional[str] = Field(description="The URL to the full documentation for the project. Blank if it doesn't exist.")
+
+
+class WireFunctionReview(BaseModel):
+    """ Compact FunctionReview
+    """
+    n: str = Field(description="The function being rated, exactly as listed")
+    c: bool = Field(description="Does the function have a clear name?")
+    d: bool = Field(description="Is the function's docstring clear and complete?")
+    m: bool = Field(description="Does the function have good comments?")
+    e: Optional[str] = Field(description="A very brief explanation if any rating is a fail, otherwise null")
+
+
+class WireCodeReview(BaseModel):
+    """ Compact CodeReview
+    """
+    h: bool = Field(description="Does the file have high-level documentation?")
+    f: bool = Field(description="Is the code appropriately factored into multiple functions?")
+    fn: list[WireFunctionReview] = Field(description="The rating of each of the listed functions")
+
+
+class WirePackedFileReview(WireCodeReview):
+    """ Compact CodeReview of one of several files reviewed together
+    """
+    i: int = Field(description="The index of the file, in the order they were given, starting at 0")
+
+
+class WirePackedCodeReview(BaseModel):
+    """ Compact review of several code files which were reviewed together
+    """
+    files: list[WirePackedFileReview] = Field(description="The review of each code file")
+
+
+class WireFunctionAnalysis(WireFunctionReview):
+    """ Compact FunctionAnalysis
+    """
+    n: str = Field(description="The function being analyzed")
+    t: bool = Field(description="Does the function have type annotations?")
+
+
+class WireCodeAnalysis(BaseModel):
+    """ Compact CodeDocumentationAnalysis
+    """
+    h: bool = Field(description="Does the file have high-level documentation?")
+    f: bool = Field(description="Is the code appropriately factored into multiple functions?")
+    fn: list[WireFunctionAnalysis] = Field(description="The analysis of the functions in the file")
+
+
+def to_readme_analysis(wire: WireReadmeAnalysis, project_name: str) -> ReadmeAnalysis:
+    """
+    Map a compact README response for the given project into a ReadmeAnalysis.
+    """
+    return ReadmeAnalysis(
+        github_commit_hash=None,
+        project_name=project_name,
+        prerequisites=[Prerequisite(description=p.d, url=p.u) for p in wire.p],
+        setup_steps=[ShellCommand(description=s.d, command=s.c) for s in wire.s],
+        setup_completeness=wire.sc,
+        readme_quality=wire.q,
+        docs_url=wire.u or "",
+    )
+
+
+def to_code_review(wire: WireCodeReview, filepath: str) -> CodeReview:
+    """
+    Map a compact code review response for the given file into a CodeReview.
+    """
+    return CodeReview(
+        filepath=filepath,
+        high_level_documentation=wire.h,
+        code_factored=wire.f,
+        function_review=[FunctionReview(function_name=fn.n, clear_name=fn.c, api_documentation=fn.d,
+                                        code_comments=fn.m, explanation=fn.e or "")
+                         for fn in wire.fn],
+    )
+
+
+def to_code_reviews(wire: WirePackedCodeReview, filepaths: list[str]) -> list[CodeReview]:
+    """
+    Map a compact review of several files, which refers to them by their index in the given list, into CodeReviews.
+    Reviews with an index out of range are left out.
+    """
+    return [to_code_review(review, filepaths[review.i]) for review in wire.files if 0 <= review.i < len(filepaths)]
+
+
+def to_code_analysis(wire: WireCodeAnalysis, filepath: str) -> CodeDocumentationAnalysis:
+    """
+    Map a compact code analysis response for the given file into a CodeDocumentationAnalysis.
+    """
+    return CodeDocumentationAnalysis(
+        filepath=filepath,
+        github_commit_hash=None,
+        high_level_documentation=wire.h,
+        code_factored=wire.f,
+        function_analysis=[FunctionAnalysis(function_name=fn.n, clear_name=fn.c, type_annotations=fn.t,
+                                            api_documentation=fn.d, code_comments=fn.m, explanation=fn.e or "")
+                           for fn in wire.fn],
+    )
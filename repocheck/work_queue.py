@@ -0,0 +1,226 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+from loguru import logger
+
+QUEUE_FILE = "queue.sqlite"
+
+# How long a worker may hold a repository before it is handed to another worker
+DEFAULT_LEASE_SECONDS = 3600
+
+# Fraction of the lease period after which a worker which is still busy renews its lease
+RENEW_FRACTION = 1 / 3
+
+# Number of failed attempts after which a repository is no longer handed out
+MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    A queue of repositories to process, stored in a SQLite database in the cache directory
+    so that several workers (on one or more machines sharing the cache directory) can
+    divide up a scan. Workers lease a repository, process it, and then mark it as done
+    or release it. Leases expire, so repositories held by a crashed worker are handed out again.
+    """
+
+    def __init__(self, cache_dir: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, QUEUE_FILE)
+        self.lease_seconds = lease_seconds
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS repos (
+                    full_name TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated REAL NOT NULL
+                )
+            """)
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection to the queue database. Connections are not shared between threads.
+        """
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+
+    def enqueue(self, full_names: list[str], reset: bool = False) -> int:
+        """
+        Add the given repositories to the queue. Repositories which are already queued are left
+        alone, unless `reset` is set, in which case they are made pending again.
+
+        Returns:
+            The number of repositories which were added or reset.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            count = 0
+            for full_name in full_names:
+                if reset:
+                    cursor = conn.execute(
+                        "INSERT INTO repos (full_name, status, updated) VALUES (?, ?, ?) "
+                        "ON CONFLICT(full_name) DO UPDATE SET status=excluded.status, worker=NULL, "
+                        "lease_expires=NULL, attempts=0, updated=excluded.updated",
+                        (full_name, PENDING, now))
+                else:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO repos (full_name, status, updated) VALUES (?, ?, ?)",
+                        (full_name, PENDING, now))
+                count += cursor.rowcount
+            conn.execute("COMMIT")
+        return count
+
+
+    def lease(self, worker: str) -> str:
+        """
+        Lease the next available repository for the given worker.
+
+        Returns:
+            The full name of the leased repository, or None if there is nothing left to do.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # Take the write lock up front so that two workers can't lease the same repository
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT full_name FROM repos WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY attempts, updated LIMIT 1",
+                (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            full_name = row[0]
+            conn.execute(
+                "UPDATE repos SET status = ?, worker = ?, lease_expires = ?, updated = ? WHERE full_name = ?",
+                (LEASED, worker, now + self.lease_seconds, now, full_name))
+            conn.execute("COMMIT")
+
+        logger.debug(f"Worker {worker} leased {full_name}")
+        return full_name
+
+
+    def renew(self, full_name: str, worker: str) -> bool:
+        """
+        Extend the lease of the given worker on the given repository by another lease period.
+
+        Returns:
+            False if the worker no longer held the lease (e.g. it expired and was taken over).
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE repos SET lease_expires = ?, updated = ? WHERE full_name = ? AND worker = ? AND status = ?",
+                (now + self.lease_seconds, now, full_name, worker, LEASED))
+            if cursor.rowcount == 0:
+                logger.warning(f"Worker {worker} could not renew its lease on {full_name}")
+                return False
+        return True
+
+
+    def heartbeat(self, full_name: str, worker: str) -> "LeaseHeartbeat":
+        """
+        Keep the lease of the given worker on the given repository alive while it is being processed:
+
+            with work_queue.heartbeat(full_name, worker):
+                ...
+        """
+        return LeaseHeartbeat(self, full_name, worker)
+
+
+    def complete(self, full_name: str, worker: str) -> bool:
+        """
+        Mark the given repository as done.
+
+        Returns:
+            False if the worker no longer held the lease (e.g. it expired and was taken over).
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE repos SET status = ?, worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE full_name = ? AND worker = ? AND status = ?",
+                (DONE, time.time(), full_name, worker, LEASED))
+            if cursor.rowcount == 0:
+                logger.warning(f"Worker {worker} completed {full_name} after losing its lease")
+                return False
+        return True
+
+
+    def release(self, full_name: str, worker: str, failed: bool = False):
+        """
+        Give up the lease on the given repository so that another worker can pick it up.
+        If `failed` is set, the attempt is counted, and the repository is marked as failed
+        once it reaches MAX_ATTEMPTS.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts FROM repos WHERE full_name = ? AND worker = ? AND status = ?",
+                               (full_name, worker, LEASED)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return
+            attempts = row[0] + 1 if failed else row[0]
+            status = FAILED if attempts >= MAX_ATTEMPTS else PENDING
+            conn.execute(
+                "UPDATE repos SET status = ?, worker = NULL, lease_expires = NULL, attempts = ?, updated = ? "
+                "WHERE full_name = ?",
+                (status, attempts, time.time(), full_name))
+            conn.execute("COMMIT")
+
+
+    def counts(self) -> dict[str, int]:
+        """
+        Get the number of repositories in each status.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM repos GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class LeaseHeartbeat:
+    """
+    A context manager which renews a lease from a background thread every RENEW_FRACTION of the lease period,
+    so that a repository which takes longer than the lease period to process (e.g. while waiting for the
+    GitHub rate limit to reset) isn't handed to another worker. Renewal stops when the context exits,
+    or if the lease was lost.
+    """
+
+    def __init__(self, work_queue: WorkQueue, full_name: str, worker: str):
+        self.work_queue = work_queue
+        self.full_name = full_name
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"lease-{full_name}", daemon=True)
+
+
+    def _run(self):
+        interval = self.work_queue.lease_seconds * RENEW_FRACTION
+        while not self.stopped.wait(interval):
+            try:
+                if not self.work_queue.renew(self.full_name, self.worker):
+                    return
+            except sqlite3.Error as e:
+                # Try again at the next interval, the lease is still good until it expires
+                logger.warning(f"Failed to renew the lease on {self.full_name}: {e}")
+
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,162 @@
+import re
+import json
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# How many times a batch is polled before it completes
+BATCH_POLLS_TO_COMPLETE = 2
+
+
+def make_completion(model: str, content: str, prompt_tokens: int = 1000, completion_tokens: int = 100) -> dict:
+    """
+    Make the body of a chat completion with the given message content.
+    """
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content, "refusal": None}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class StubOpenAIServer:
+    """
+    A local stand-in for the parts of the OpenAI API used by repocheck (Chat Completions, Files and Batches),
+    so that those flows can be tested offline. Point a client at `base_url` with any API key.
+
+    Batch requests are answered with `answers`, which maps the name of the response format (the JSON schema
+    name) to the JSON object to respond with. Requests for any other response format fail in the batch output.
+    Chat completion requests are all answered with the message content in `chat_content`, like a local
+    server without structured output, except that while `chat_errors` has (status, headers) entries, each
+    request takes the first one and fails with it instead.
+    """
+
+    def __init__(self, answers: dict[str, dict] = None, chat_content: str = ""):
+        self.answers = answers or {}
+        self.chat_content = chat_content
+        self.files = {}
+        self.batches = {}
+        self.requests = []
+        self.chat_requests = []
+        self.chat_errors = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+
+    def start(self) -> "StubOpenAIServer":
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def answer(self, body: dict) -> dict:
+        """
+        Get the batch output line for a chat completion request body.
+        """
+        name = body["response_format"]["json_schema"]["name"]
+        if name not in self.answers:
+            return {"status_code": 400, "body": {"error": {"message": f"No answer for {name}"}}}
+        return {"status_code": 200, "body": make_completion(body["model"], json.dumps(self.answers[name]))}
+
+
+    def create_file(self, body: bytes) -> dict:
+        # Only the JSONL lines of the multipart upload are kept
+        lines = [line for line in body.split(b"\r\n") if line.startswith(b'{"custom_id"')]
+        file_id = f"file-{uuid.uuid4().hex[:8]}"
+        self.files[file_id] = b"\n".join(lines)
+        return {"id": file_id, "object": "file", "bytes": len(body), "created_at": 0,
+                "filename": "input.jsonl", "purpose": "batch", "status": "processed"}
+
+
+    def create_batch(self, request: dict) -> dict:
+        output = []
+        for line in self.files[request["input_file_id"]].splitlines():
+            batch_request = json.loads(line)
+            self.requests.append(batch_request)
+            output.append(json.dumps({"custom_id": batch_request["custom_id"], "response": self.answer(batch_request["body"])}))
+        output_file_id = f"file-{uuid.uuid4().hex[:8]}"
+        self.files[output_file_id] = "\n".join(output).encode()
+
+        batch_id = f"batch_{uuid.uuid4().hex[:8]}"
+        self.batches[batch_id] = {
+            "batch": {"id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                      "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                      "created_at": 0, "status": "in_progress", "output_file_id": None,
+                      "request_counts": {"total": len(output), "completed": 0, "failed": 0}},
+            "output_file_id": output_file_id,
+            "polls": 0,
+        }
+        return self.batches[batch_id]["batch"]
+
+
+    def retrieve_batch(self, batch_id: str) -> dict:
+        state = self.batches[batch_id]
+        state["polls"] += 1
+        batch = state["batch"]
+        if state["polls"] >= BATCH_POLLS_TO_COMPLETE:
+            batch["status"] = "completed"
+            batch["output_file_id"] = state["output_file_id"]
+            batch["request_counts"]["completed"] = batch["request_counts"]["total"]
+        return batch
+
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, data: bytes, content_type: str = "application/json", status: int = 200, headers: dict = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_json(self, obj: dict):
+                self.send(json.dumps(obj).encode())
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path.endswith("/chat/completions"):
+                    request = json.loads(body)
+                    stub.chat_requests.append(request)
+                    if stub.chat_errors:
+                        status, headers = stub.chat_errors.pop(0)
+                        self.send(b'{"error": {"message": "Stub error"}}', status=status, headers=headers)
+                    else:
+                        self.send_json(make_completion(request["model"], stub.chat_content))
+                elif self.path.endswith("/files"):
+                    self.send_json(stub.create_file(body))
+                elif self.path.endswith("/batches"):
+                    self.send_json(stub.create_batch(json.loads(body)))
+                else:
+                    self.send(b'{"error": {"message": "Not found"}}', status=404)
+
+            def do_GET(self):
+                if match := re.search(r"/batches/([^/]+)$", self.path):
+                    self.send_json(stub.retrieve_batch(match.group(1)))
+                elif match := re.search(r"/files/([^/]+)/content$", self.path):
+                    self.send(stub.files[match.group(1)], "application/octet-stream")
+                else:
+                    self.send(b'{"error": {"message": "Not found"}}', status=404)
+
+        return Handler
@@ -0,0 +1,113 @@
+import json
+import time
+import unittest
+import dataclasses
+from unittest import mock
+
+from openai import OpenAI
+
+import repocheck.repocheck as repocheck
+from repocheck.backend import BACKENDS, FREE, parse_json_content
+from repocheck.rate_limit import RateLimiter
+from repocheck.wire import WireCodeReview
+from tests.stub_openai import StubOpenAIServer
+
+CODE_REVIEW = {"h": True, "f": True, "fn": [{"n": "main", "c": True, "d": True, "m": False, "e": "No comments"}]}
+
+
+class ParseJsonContentTest(unittest.TestCase):
+
+    def test_code_fence(self):
+        content = f"Here is the review:\n```json\n{json.dumps(CODE_REVIEW)}\n```"
+        self.assertEqual(parse_json_content(content, WireCodeReview), WireCodeReview.model_validate(CODE_REVIEW))
+
+    def test_no_object(self):
+        with self.assertRaises(ValueError):
+            parse_json_content("I can't review this file.", WireCodeReview)
+
+    def test_invalid_object(self):
+        with self.assertRaises(ValueError):
+            parse_json_content('{"h": true}', WireCodeReview)
+
+
+class PricingTest(unittest.TestCase):
+
+    def test_unpriced_backend_is_free(self):
+        self.assertEqual(BACKENDS["local"].get_pricing("any-model"), FREE)
+        self.assertTrue(BACKENDS["local"].has_pricing("any-model"))
+
+    def test_unknown_model_on_priced_backend(self):
+        self.assertFalse(BACKENDS["openai"].has_pricing("gpt-unknown"))
+        with self.assertRaises(ValueError):
+            BACKENDS["openai"].get_pricing("gpt-unknown")
+
+
+class LocalBackendTest(unittest.TestCase):
+    """
+    Calls to a backend without structured output, against a stub chat completions server.
+    """
+
+    def setUp(self):
+        content = f"```json\n{json.dumps(CODE_REVIEW)}\n```"
+        self.server = StubOpenAIServer(chat_content=content).start()
+        self.client = OpenAI(base_url=self.server.base_url, api_key="test", max_retries=0)
+        backend = dataclasses.replace(BACKENDS["local"], base_url=self.server.base_url)
+        # Like the limiter of a run with --backend local
+        rate_limiter = RateLimiter()
+        rate_limiter.disable()
+        self.patches = [mock.patch.object(repocheck, "LLM_BACKEND", backend),
+                        mock.patch.object(repocheck, "RATE_LIMITER", rate_limiter)]
+        for patch in self.patches:
+            patch.start()
+
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.client.close()
+        self.server.stop()
+
+
+    def test_send_request(self):
+        response = repocheck.send_request(self.client, "Review the code.", "def main(): pass", WireCodeReview, "local-model")
+        completion = response.parse()
+
+        request = self.server.chat_requests[0]
+        self.assertEqual(request["model"], "local-model")
+        self.assertNotIn("response_format", request)
+        system_prompt = request["messages"][0]["content"]
+        self.assertTrue(system_prompt.startswith("Review the code."))
+        self.assertIn(json.dumps(WireCodeReview.model_json_schema()), system_prompt)
+        self.assertEqual(request["messages"][1]["content"], "def main(): pass")
+        self.assertEqual(completion.choices[0].message.content, self.server.chat_content)
+
+
+    def test_request_completion(self):
+        completion, parsed, cost = repocheck.request_completion(self.client, "main.py", "Review the code.", "def main(): pass",
+                                                                WireCodeReview, 100, "local-model")
+        self.assertIsNotNone(completion)
+        self.assertEqual(parsed, WireCodeReview.model_validate(CODE_REVIEW))
+        self.assertEqual(cost, 0)
+
+
+    def test_request_completion_unparseable(self):
+        self.server.chat_content = "Sorry, I can't help with that."
+        completion, parsed, cost = repocheck.request_completion(self.client, "main.py", "Review the code.", "def main(): pass",
+                                                                WireCodeReview, 100, "local-model")
+        self.assertIsNotNone(completion)
+        self.assertIsNone(parsed)
+
+
+    def test_rate_limited_without_limiter(self):
+        # An overloaded server turns calls away with 429s, which are waited out even though calls aren't paced
+        self.server.chat_errors = [(429, {"Retry-After": "1"})] * 2
+        started = time.monotonic()
+        completion, parsed, cost = repocheck.request_completion(self.client, "main.py", "Review the code.", "def main(): pass",
+                                                                WireCodeReview, 100, "local-model")
+        self.assertGreaterEqual(time.monotonic() - started, 2)
+        self.assertEqual(len(self.server.chat_requests), 3)
+        self.assertEqual(parsed, WireCodeReview.model_validate(CODE_REVIEW))
+
+
+if __name__ == "__main__":
+    unittest.main()
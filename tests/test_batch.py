@@ -0,0 +1,110 @@
+import os
+import json
+import tempfile
+import unittest
+
+from openai import OpenAI
+
+from repocheck.batch import BatchRunner, COLLECT, ASSEMBLE
+from repocheck.response_cache import ResponseCache
+from repocheck.wire import WireCodeReview, WireReadmeAnalysis
+from tests.stub_openai import StubOpenAIServer
+
+MODEL = "gpt-4o-mini"
+
+CODE_REVIEW = {"h": True, "f": False, "fn": [{"n": "main", "c": True, "d": False, "m": True, "e": "No docstring"}]}
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubOpenAIServer({"WireCodeReview": CODE_REVIEW}).start()
+        self.client = OpenAI(base_url=self.server.base_url, api_key="test", max_retries=0)
+        self.batch_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+
+    def collect(self, runner: BatchRunner, user_prompt: str, response_format) -> str:
+        key = ResponseCache.get_key(MODEL, "system", response_format, user_prompt)
+        runner.collect(key, MODEL, "system", user_prompt, response_format)
+        return key
+
+
+    def test_round_trip(self):
+        runner = BatchRunner()
+        runner.start(COLLECT)
+        code_key = self.collect(runner, "code", WireCodeReview)
+        self.collect(runner, "code", WireCodeReview)
+        readme_key = self.collect(runner, "readme", WireReadmeAnalysis)
+        runner.stop()
+        # Identical calls are only requested once
+        self.assertEqual(len(runner.requests), 2)
+
+        batch_ids = runner.submit(self.client, runner.write_batch_files(self.batch_dir))
+        batches = runner.wait(self.client, batch_ids, poll_seconds=0)
+        self.assertEqual([batch.status for batch in batches], ["completed"])
+        runner.load_results(self.client, batches, self.batch_dir)
+
+        runner.start(ASSEMBLE)
+        completion, parsed = runner.get_result(code_key, WireCodeReview)
+        self.assertEqual(completion.usage.prompt_tokens, 1000)
+        self.assertEqual(parsed, WireCodeReview.model_validate(CODE_REVIEW))
+
+        # The stub fails requests it has no answer for, which leaves them without a result
+        self.assertEqual(runner.get_result(readme_key, WireReadmeAnalysis), (None, None))
+
+
+    def test_requests_use_structured_output(self):
+        runner = BatchRunner()
+        runner.start(COLLECT)
+        self.collect(runner, "code", WireCodeReview)
+        runner.submit(self.client, runner.write_batch_files(self.batch_dir))
+
+        body = self.server.requests[0]["body"]
+        self.assertEqual(body["model"], MODEL)
+        self.assertEqual(body["response_format"]["type"], "json_schema")
+        self.assertEqual(body["response_format"]["json_schema"]["name"], "WireCodeReview")
+        self.assertTrue(body["response_format"]["json_schema"]["strict"])
+
+
+    def test_batch_files_are_split_by_size(self):
+        runner = BatchRunner()
+        runner.start(COLLECT)
+        keys = {self.collect(runner, f"code {i} " + "x" * 1000, WireCodeReview) for i in range(10)}
+        line_size = len(json.dumps({"custom_id": "", "method": "POST", "url": "", "body": next(iter(runner.requests.values()))}))
+
+        # Room for three requests in each file
+        paths = runner.write_batch_files(self.batch_dir, max_bytes=line_size * 3 + 1000)
+        self.assertEqual(len(paths), 4)
+        written = set()
+        for path in paths:
+            self.assertLessEqual(os.path.getsize(path), line_size * 3 + 1000)
+            with open(path, "r", encoding="utf-8") as f:
+                written.update(json.loads(line)["custom_id"] for line in f)
+        self.assertEqual(written, keys)
+
+
+    def test_batch_files_are_split_by_count(self):
+        runner = BatchRunner()
+        runner.start(COLLECT)
+        for i in range(5):
+            self.collect(runner, f"code {i}", WireCodeReview)
+        paths = runner.write_batch_files(self.batch_dir, max_requests=2)
+        self.assertEqual(len(paths), 3)
+
+
+    def test_reservations(self):
+        runner = BatchRunner()
+        runner.start(COLLECT)
+        runner.set_reservations({"a": 1.0, "b": 2.0})
+        self.assertEqual(runner.take_reservation("a"), 1.0)
+        self.assertEqual(runner.take_reservation("a"), 0)
+        self.assertEqual(runner.take_all_reservations(), 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import ast
+import unittest
+
+from repocheck.chunking import split_python_source, count_tokens
+from repocheck.code_facts import extract_functions
+from repocheck.model import CodeDocumentationAnalysis, FunctionAnalysis
+from repocheck.repocheck import merge_chunk_analyses
+
+MAX_TOKENS = 1000
+
+
+def make_class(methods: int) -> str:
+    body = "".join(f"    @property\n    def method{i}(self, x: int) -> int:\n        \"\"\"Return x plus {i}.\"\"\"\n"
+                   f"        return x + {i}\n\n" for i in range(methods))
+    return f"@dataclass\nclass Generated(Base):\n    \"\"\"A generated class.\"\"\"\n    VERSION = 1\n\n{body}"
+
+
+def make_analysis(function_name: str, high_level_documentation: bool = True) -> CodeDocumentationAnalysis:
+    return CodeDocumentationAnalysis(
+        filepath="module.py",
+        github_commit_hash=None,
+        high_level_documentation=high_level_documentation,
+        code_factored=True,
+        function_analysis=[FunctionAnalysis(function_name=function_name, clear_name=True, type_annotations=True,
+                                            api_documentation=True, code_comments=True, explanation="")],
+    )
+
+
+class SplitPythonSourceTest(unittest.TestCase):
+
+    def test_small_source(self):
+        source = "def main():\n    pass\n"
+        self.assertEqual(split_python_source(source, MAX_TOKENS), [source])
+
+    def test_huge_class_is_split_along_methods(self):
+        source = "\"\"\"A generated module.\"\"\"\nimport os\n\n" + make_class(300) + "\ndef main():\n    pass\n"
+        chunks = split_python_source(source, MAX_TOKENS)
+        self.assertGreater(len(chunks), 2)
+
+        names = []
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), MAX_TOKENS)
+            ast.parse(chunk)
+            names += [function.name for function in extract_functions(chunk)]
+        self.assertEqual(names, [f"Generated.method{i}" for i in range(300)] + ["main"])
+
+        # The decorator stays with the first part of the class, later parts only repeat the class line
+        class_chunks = [chunk for chunk in chunks if "class Generated" in chunk]
+        self.assertTrue(class_chunks[0].startswith("@dataclass\nclass Generated(Base):\n"))
+        for chunk in class_chunks[1:]:
+            self.assertTrue(chunk.startswith("class Generated(Base):\n    @property\n"))
+
+    def test_unparseable_source_is_split_by_lines(self):
+        source = "def broken(:\n" + "x = 1\n" * 2000
+        chunks = split_python_source(source, MAX_TOKENS)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), source)
+
+
+class MergeChunkAnalysesTest(unittest.TestCase):
+
+    def test_merge(self):
+        merged = merge_chunk_analyses([make_analysis("a"), make_analysis("b", high_level_documentation=False)])
+        self.assertTrue(merged.high_level_documentation)
+        self.assertEqual([function.function_name for function in merged.function_analysis], ["a", "b"])
+
+    def test_first_chunk_failed(self):
+        merged = merge_chunk_analyses([None, make_analysis("b"), make_analysis("c")])
+        self.assertFalse(merged.high_level_documentation)
+        self.assertEqual([function.function_name for function in merged.function_analysis], ["b", "c"])
+
+    def test_all_chunks_failed(self):
+        self.assertIsNone(merge_chunk_analyses([None, None]))
+
+
+if __name__ == "__main__":
+    unittest.main()
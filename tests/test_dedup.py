@@ -0,0 +1,149 @@
+import time
+import types
+import unittest
+import threading
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import repocheck.repocheck as repocheck
+from repocheck.dedup import ContentDeduplicator, get_content_key
+from repocheck.model import CodeDocumentationAnalysis
+
+
+class ContentKeyTest(unittest.TestCase):
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(get_content_key("a = 1\r\nb = 2\r\n"), get_content_key("\na = 1   \nb = 2\n\n"))
+
+    def test_indentation_is_kept(self):
+        self.assertNotEqual(get_content_key("if x:\n    a = 1\n"), get_content_key("if x:\na = 1\n"))
+
+
+class ContentDeduplicatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dedup = ContentDeduplicator()
+
+
+    def test_reuse(self):
+        future, owner = self.dedup.claim("key")
+        self.assertTrue(owner)
+        self.dedup.resolve("key", "analysis")
+
+        future, owner = self.dedup.claim("key")
+        self.assertFalse(owner)
+        self.assertEqual(future.result(), "analysis")
+        self.assertEqual(self.dedup.reused, 1)
+
+
+    def test_concurrent_claims_are_coalesced(self):
+        analyses = []
+        started = threading.Barrier(8)
+
+        def analyze(_) -> str:
+            started.wait()
+            future, owner = self.dedup.claim("key")
+            if owner:
+                analyses.append(1)
+                time.sleep(0.1)
+                self.dedup.resolve("key", "analysis")
+            return future.result(timeout=5)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(analyze, range(8)))
+        self.assertEqual(results, ["analysis"] * 8)
+        self.assertEqual(len(analyses), 1)
+        self.assertEqual(self.dedup.coalesced, 7)
+
+
+    def test_failed_analysis_is_not_kept(self):
+        self.dedup.claim("key")
+        waiting, owner = self.dedup.claim("key")
+        self.assertFalse(owner)
+        self.dedup.resolve("key", None)
+        self.assertIsNone(waiting.result())
+
+        # The next claim analyzes the content again
+        _, owner = self.dedup.claim("key")
+        self.assertTrue(owner)
+
+
+    def test_resolve_only_once(self):
+        future, _ = self.dedup.claim("key")
+        self.dedup.resolve("key", "analysis")
+        self.dedup.resolve("key", None)
+        self.assertEqual(future.result(), "analysis")
+        _, owner = self.dedup.claim("key")
+        self.assertFalse(owner)
+
+
+    def test_errors_are_passed_on(self):
+        self.dedup.claim("key")
+        waiting, _ = self.dedup.claim("key")
+        self.dedup.fail("key", RuntimeError("down"))
+        with self.assertRaises(RuntimeError):
+            waiting.result()
+        _, owner = self.dedup.claim("key")
+        self.assertTrue(owner)
+
+
+
+class AnalyzeCodeTest(unittest.TestCase):
+    """
+    Identical files in several repositories, analyzed with a stand-in for the LLM analysis of a file.
+    """
+
+    def setUp(self):
+        self.analyzed = []
+        self.patches = [mock.patch.object(repocheck, "CONTENT_DEDUP", ContentDeduplicator()),
+                        mock.patch.object(repocheck, "PACK_SMALL_FILES", False),
+                        mock.patch.object(repocheck, "analyze_code_file", self.analyze_code_file)]
+        for patch in self.patches:
+            patch.start()
+
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+
+    def analyze_code_file(self, client, project_cache, filepath: str, file_content: str):
+        self.analyzed.append(filepath)
+        time.sleep(0.1)
+        if "broken" in file_content:
+            return None, 0.5
+        return CodeDocumentationAnalysis(filepath=filepath, github_commit_hash=project_cache.repo_full_name,
+                                         high_level_documentation=True, code_factored=True, function_analysis=[]), 1.0
+
+
+    def make_project_cache(self, repo_full_name: str):
+        return types.SimpleNamespace(repo_full_name=repo_full_name, get_commit_hash=lambda filepath: repo_full_name)
+
+
+    def test_identical_files_are_analyzed_once(self):
+        code_a = {"a.py": "x = 1\n", "b.py": "y = 2\n", "c.py": "broken", "d.py": "x = 1"}
+        code_b = {"z.py": "x = 1  \r\n", "w.py": "broken", "v.py": "z = 3\n"}
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future_a = executor.submit(repocheck.analyze_code, None, self.make_project_cache("org/a"), code_a)
+            time.sleep(0.05)
+            future_b = executor.submit(repocheck.analyze_code, None, self.make_project_cache("org/b"), code_b)
+            results_a, cost_a = future_a.result()
+            results_b, cost_b = future_b.result()
+
+        self.assertEqual(sorted(self.analyzed), ["a.py", "b.py", "c.py", "v.py"])
+        self.assertEqual((cost_a, cost_b), (2.5, 1.0))
+        # Each repository gets its own copy of the analysis, in the order of its files
+        self.assertEqual([(result.filepath, result.github_commit_hash) for result in results_a],
+                         [("a.py", "org/a"), ("b.py", "org/a"), ("d.py", "org/a")])
+        self.assertEqual([(result.filepath, result.github_commit_hash) for result in results_b],
+                         [("z.py", "org/b"), ("v.py", "org/b")])
+
+        # Content which couldn't be analyzed is tried again by the next repository
+        self.analyzed.clear()
+        results_c, _ = repocheck.analyze_code(None, self.make_project_cache("org/c"), {"k.py": "y = 2", "e.py": "broken"})
+        self.assertEqual(self.analyzed, ["e.py"])
+        self.assertEqual([result.filepath for result in results_c], ["k.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import time
+import unittest
+import threading
+
+import httpx
+import openai
+
+from repocheck.retry import (CircuitBreaker, is_retryable, get_retry_after, get_backoff_delay,
+                             BACKOFF_MAX_SECONDS)
+
+# Short enough to wait out during the tests
+COOLDOWN_SECONDS = 0.2
+
+
+def make_status_error(status_code: int, headers: dict = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_is_retryable(self):
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        self.assertTrue(is_retryable(openai.APITimeoutError(request=request)))
+        self.assertTrue(is_retryable(openai.APIConnectionError(request=request)))
+        for status_code in (429, 500, 503, 529):
+            self.assertTrue(is_retryable(make_status_error(status_code)))
+        for status_code in (400, 401, 404):
+            self.assertFalse(is_retryable(make_status_error(status_code)))
+        self.assertFalse(is_retryable(ValueError("bad response")))
+
+    def test_get_retry_after(self):
+        self.assertEqual(get_retry_after(make_status_error(429, {"retry-after": "7"})), 7)
+        self.assertEqual(get_retry_after(make_status_error(429, {"retry-after-ms": "1500"})), 1.5)
+        self.assertIsNone(get_retry_after(make_status_error(429)))
+        self.assertIsNone(get_retry_after(ValueError()))
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            self.assertLessEqual(get_backoff_delay(attempt), BACKOFF_MAX_SECONDS)
+        self.assertGreaterEqual(get_backoff_delay(0, retry_after=30), 30)
+        self.assertEqual(get_backoff_delay(0, retry_after=10_000), BACKOFF_MAX_SECONDS)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=COOLDOWN_SECONDS)
+
+
+    def assert_waits(self, seconds: float):
+        started = time.monotonic()
+        self.breaker.wait()
+        self.assertGreaterEqual(time.monotonic() - started, seconds * 0.9)
+
+
+    def test_closed(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        started = time.monotonic()
+        self.breaker.wait()
+        self.assertLess(time.monotonic() - started, 0.05)
+
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertIsNone(self.breaker.open_until)
+
+
+    def test_opens_after_threshold(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.assertIsNotNone(self.breaker.open_until)
+        self.assert_waits(COOLDOWN_SECONDS)
+        self.breaker.record_success()
+        self.assertIsNone(self.breaker.open_until)
+
+
+    def test_failed_trial_doubles_cooldown(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.breaker.wait()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.cooldown_seconds, COOLDOWN_SECONDS * 2)
+        self.assert_waits(COOLDOWN_SECONDS * 2)
+
+
+    def test_single_trial_call(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        passed = []
+        def call():
+            self.breaker.wait()
+            passed.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(COOLDOWN_SECONDS + 0.2)
+        # Only the trial call is let through until it succeeds
+        self.assertEqual(len(passed), 1)
+        self.breaker.record_success()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(len(passed), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from repocheck.run_journal import RunJournal, DONE, FAILED
+
+ORG_SCAN = {"orgs": "JaneliaSciComp", "repos": None, "shard": None, "queue": False}
+
+
+def shard_scan(index: int) -> dict:
+    return dict(ORG_SCAN, shard=f"{index}/4")
+
+
+class RunJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+
+    def test_resume(self):
+        journal = RunJournal(self.cache_dir, scan=ORG_SCAN)
+        journal.record("org/a", DONE)
+        journal.record("org/b", FAILED, reason="timeout")
+
+        resumed = RunJournal.latest(self.cache_dir, ORG_SCAN)
+        self.assertEqual(resumed.run_id, journal.run_id)
+        self.assertEqual(resumed.scan, ORG_SCAN)
+        self.assertTrue(resumed.is_finished("org/a"))
+        self.assertFalse(resumed.is_finished("org/b"))
+        self.assertEqual(resumed.summary()[DONE], 1)
+
+
+    def test_latest_matches_scan(self):
+        shard0 = RunJournal(self.cache_dir, scan=shard_scan(0))
+        shard0.record("org/a", DONE)
+        # Started later, so it sorts after shard 0
+        shard3 = RunJournal(self.cache_dir, run_id="99999999-999999-ffffff", scan=shard_scan(3))
+        shard3.record("org/b", DONE)
+
+        self.assertEqual(RunJournal.latest(self.cache_dir, shard_scan(0)).run_id, shard0.run_id)
+        self.assertEqual(RunJournal.latest(self.cache_dir, shard_scan(3)).run_id, shard3.run_id)
+        self.assertIsNone(RunJournal.latest(self.cache_dir, shard_scan(1)))
+        self.assertEqual(RunJournal.latest(self.cache_dir).run_id, shard3.run_id)
+
+
+    def test_open(self):
+        journal = RunJournal(self.cache_dir, scan=ORG_SCAN)
+        self.assertEqual(RunJournal.open(self.cache_dir, journal.run_id).scan, ORG_SCAN)
+        self.assertIsNone(RunJournal.open(self.cache_dir, "missing"))
+
+
+    def test_run_ids_are_unique(self):
+        run_ids = {RunJournal(self.cache_dir, scan=ORG_SCAN).run_id for _ in range(20)}
+        self.assertEqual(len(run_ids), 20)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, "runs"))), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from repocheck.sampling import sample_files, get_stratum
+
+# Number of random file trees to check the stability of the sample on
+TRIALS = 500
+
+
+def make_sizes(rng: random.Random, count: int, dirs: list[str]) -> dict[str, int]:
+    sizes = {}
+    for i in range(count):
+        directory = rng.choice(dirs)
+        path = f"{directory}/file{i}.py" if directory else f"file{i}.py"
+        sizes[path] = rng.randint(10, 50_000)
+    return sizes
+
+
+class SamplingTest(unittest.TestCase):
+
+    def test_small_repository(self):
+        sizes = {"b.py": 10, "a.py": 20}
+        self.assertEqual(sample_files(sizes, 10), ["a.py", "b.py"])
+
+
+    def test_deterministic(self):
+        sizes = make_sizes(random.Random(1), 50, ["", "src", "tests", "scripts"])
+        sample = sample_files(sizes, 10)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(sample, sorted(sample))
+        shuffled = list(sizes.items())
+        random.Random(2).shuffle(shuffled)
+        self.assertEqual(sample_files(dict(shuffled), 10), sample)
+
+
+    def test_stratified(self):
+        sizes = {f"src/file{i}.py": 1000 for i in range(50)}
+        sizes.update({"tests/test_a.py": 10, "scripts/run.py": 10, "setup.py": 10})
+        strata = {get_stratum(path) for path in sample_files(sizes, 5)}
+        self.assertEqual(strata, {"src", "tests", "scripts", ""})
+
+
+    def test_adding_file_displaces_at_most_one(self):
+        rng = random.Random(0)
+        for _ in range(TRIALS):
+            dirs = ["", *[f"dir{i}" for i in range(rng.randint(1, 6))]]
+            sizes = make_sizes(rng, rng.randint(5, 60), dirs)
+            max_files = rng.randint(1, 15)
+            sample = set(sample_files(sizes, max_files))
+
+            directory = rng.choice(dirs + ["new"])
+            added = dict(sizes)
+            added[f"{directory}/added.py" if directory else "added.py"] = rng.randint(10, 50_000)
+            self.assertLessEqual(len(sample - set(sample_files(added, max_files))), 1)
+
+
+    def test_removing_file_displaces_at_most_one(self):
+        rng = random.Random(0)
+        for _ in range(TRIALS):
+            dirs = ["", *[f"dir{i}" for i in range(rng.randint(1, 6))]]
+            sizes = make_sizes(rng, rng.randint(5, 60), dirs)
+            max_files = rng.randint(1, 15)
+            sample = set(sample_files(sizes, max_files))
+
+            removed_path = rng.choice(sorted(sizes))
+            removed = dict(sizes)
+            del removed[removed_path]
+            self.assertLessEqual(len(sample - {removed_path} - set(sample_files(removed, max_files))),
+                                 0 if removed_path in sample else 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
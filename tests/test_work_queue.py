@@ -0,0 +1,117 @@
+import time
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from repocheck.work_queue import WorkQueue, MAX_ATTEMPTS, DONE, FAILED, PENDING, LEASED
+
+# Short enough for leases to expire during the tests
+LEASE_SECONDS = 0.3
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = WorkQueue(tempfile.mkdtemp(), lease_seconds=LEASE_SECONDS)
+
+
+    def test_enqueue(self):
+        self.assertEqual(self.queue.enqueue(["org/a", "org/b"]), 2)
+        self.assertEqual(self.queue.enqueue(["org/a", "org/c"]), 1)
+        self.assertEqual(self.queue.counts(), {PENDING: 3})
+
+
+    def test_lease_and_complete(self):
+        self.queue.enqueue(["org/a"])
+        self.assertEqual(self.queue.lease("w1"), "org/a")
+        self.assertIsNone(self.queue.lease("w2"))
+        self.assertTrue(self.queue.complete("org/a", "w1"))
+        self.assertEqual(self.queue.counts(), {DONE: 1})
+        self.assertIsNone(self.queue.lease("w2"))
+
+
+    def test_reset(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        self.queue.complete("org/a", "w1")
+        self.assertEqual(self.queue.enqueue(["org/a"], reset=True), 1)
+        self.assertEqual(self.queue.lease("w2"), "org/a")
+
+
+    def test_concurrent_leases_are_exclusive(self):
+        full_names = [f"org/repo{i}" for i in range(50)]
+        self.queue.enqueue(full_names)
+
+        def work(worker: str) -> list[str]:
+            leased = []
+            while (full_name := self.queue.lease(worker)) is not None:
+                leased.append(full_name)
+                self.queue.complete(full_name, worker)
+            return leased
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(work, [f"w{i}" for i in range(8)]))
+        leased = [full_name for result in results for full_name in result]
+        self.assertEqual(sorted(leased), sorted(full_names))
+
+
+    def test_expired_lease_is_taken_over(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        time.sleep(LEASE_SECONDS + 0.1)
+
+        self.assertEqual(self.queue.lease("w2"), "org/a")
+        # The first worker lost its lease, so it can neither renew nor complete it
+        self.assertFalse(self.queue.renew("org/a", "w1"))
+        self.assertFalse(self.queue.complete("org/a", "w1"))
+        self.queue.release("org/a", "w1", failed=True)
+        self.assertEqual(self.queue.counts(), {LEASED: 1})
+        self.assertTrue(self.queue.complete("org/a", "w2"))
+
+
+    def test_renewed_lease_is_kept(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        for _ in range(3):
+            time.sleep(LEASE_SECONDS / 2)
+            self.assertTrue(self.queue.renew("org/a", "w1"))
+        self.assertIsNone(self.queue.lease("w2"))
+
+
+    def test_heartbeat(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        with self.queue.heartbeat("org/a", "w1"):
+            time.sleep(LEASE_SECONDS * 3)
+            self.assertIsNone(self.queue.lease("w2"))
+        self.assertTrue(self.queue.complete("org/a", "w1"))
+
+
+    def test_heartbeat_stops_on_exit(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        with self.queue.heartbeat("org/a", "w1"):
+            pass
+        time.sleep(LEASE_SECONDS + 0.1)
+        self.assertEqual(self.queue.lease("w2"), "org/a")
+
+
+    def test_release(self):
+        self.queue.enqueue(["org/a"])
+        self.queue.lease("w1")
+        self.queue.release("org/a", "w1")
+        self.assertEqual(self.queue.lease("w2"), "org/a")
+
+
+    def test_failed_until_max_attempts(self):
+        self.queue.enqueue(["org/a"])
+        for attempt in range(MAX_ATTEMPTS):
+            worker = f"w{attempt}"
+            self.assertEqual(self.queue.lease(worker), "org/a")
+            self.queue.release("org/a", worker, failed=True)
+        self.assertEqual(self.queue.counts(), {FAILED: 1})
+        self.assertIsNone(self.queue.lease("w9"))
+
+
+if __name__ == "__main__":
+    unittest.main()